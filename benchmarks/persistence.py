@@ -0,0 +1,340 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Persistence benchmark, run it offline from the root directory of the project:
+#
+#     python -m benchmarks.persistence
+#     python -m benchmarks.persistence --groups 1000 10000 100000 --users 1000000 --keywords 100
+#
+# Every case runs in a new process, so the peak RSS of a case is not affected by the other cases.
+# A keywords case is skipped if the peak RSS of the smaller cases shows it will not fit in the available memory,
+# 100000 groups with 100 keywords need about 40 GB
+
+import argparse
+import json
+import pickle
+import resource
+from multiprocessing import get_context
+from os import listdir, makedirs, sysconf
+from os.path import getsize, join
+from random import Random
+from shutil import rmtree
+from statistics import median
+from tempfile import mkdtemp
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Set
+
+from plugins.containers import IdSet, ScoreTable
+from plugins.storage import SQLiteStorage, UserTable, load_shards, load_snapshot, write_snapshot
+
+# Projects of the user scores
+PROJECTS = ["captcha", "clean", "lang", "long", "noflood", "noporn", "nospam", "warn"]
+
+# Saves measured for each case
+ROUNDS = 5
+
+# The pickled id set of 100000 members should be at least this many times smaller than a pickled set,
+# the gaps between the sparse user ids have about 17 bits of entropy, so a ratio close to 3 is the limit,
+# the gaps are wider in the smaller groups, and the ratio is lower
+IDS_RATIO = 2.4
+
+
+def get_keywords(groups: int, keywords: int, seed: int = 79) -> Dict[int, dict]:
+    # Generate synthetic keywords data, {gid: {"lock": 0, "aid": 0, "kws": {key: keyword}}}
+    random = Random(seed)
+    result = {}
+
+    for i in range(groups):
+        gid = -1001000000000 - i
+        result[gid] = {
+            "lock": 0,
+            "aid": 0,
+            "kws": {}
+        }
+
+        for j in range(keywords):
+            words = {f"word{random.randrange(1000000)}" for _ in range(random.randint(1, 5))}
+            reply = f"reply {j} " * random.randint(1, 20)
+            result[gid]["kws"][f"{j:08x}"] = {
+                "time": 0,
+                "aid": 0,
+                "words": words,
+                "reply": reply,
+                "modes": {"include"},
+                "actions": {"reply"},
+                "target": "all",
+                "destruct": 300,
+                "count": random.randrange(1000),
+                "today": 0,
+                "raw": f"{' || '.join(words)}\n+++\n{reply}"
+            }
+
+    return result
+
+
+def get_member_ids(members: int, seed: int = 79) -> Set[int]:
+    # Generate synthetic member ids, sparse user ids of the old and the new accounts
+    random = Random(seed)
+    result = set()
+
+    while len(result) < members:
+        result.add(random.randrange(100000000, 7000000000))
+
+    return result
+
+
+def get_available() -> int:
+    # Get the available memory in bytes, 0 if it is unknown
+    try:
+        return sysconf("SC_AVPHYS_PAGES") * sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError):
+        return 0
+
+
+def get_users(users: int, seed: int = 79) -> ScoreTable:
+    # Generate synthetic user scores
+    random = Random(seed)
+    result = ScoreTable(PROJECTS)
+
+    for i in range(users):
+        scores = {p: round(random.random(), 1) if random.random() < 0.1 else 0.0 for p in PROJECTS}
+        result[100000000 + i] = {"score": scores}
+
+    return result
+
+
+def get_rss() -> int:
+    # Get the peak RSS of the current process in bytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_size(path: str) -> int:
+    # Get the total size of a file or a directory
+    try:
+        return sum(get_size(join(path, name)) for name in listdir(path))
+    except NotADirectoryError:
+        return getsize(path)
+
+
+def check_ids(members: int, seed: int = 79) -> float:
+    # Get the ratio of the pickled size of a set to the pickled size of the id set, fail if it is too small
+    ids = get_member_ids(members, seed)
+    result = len(pickle.dumps(set(ids))) / len(pickle.dumps(IdSet(ids)))
+    assert result >= IDS_RATIO, f"The id set of {members} members is only {result:.2f}x smaller than a set"
+
+    return result
+
+
+def measure(function: Callable, rounds: int = ROUNDS) -> float:
+    # Get the median time of a function
+    times = []
+
+    for _ in range(rounds):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    return median(times)
+
+
+def bench_pickle(data: Any, path: str, change: Callable) -> Dict[str, float]:
+    # Whole-file snapshot, every save writes the whole variable
+    file = join(path, "data")
+    backup = join(path, "backup")
+
+    def save() -> None:
+        change()
+        write_snapshot(file, backup, data)
+
+    save_time = measure(save)
+    written = getsize(file)
+    load_time = measure(lambda: load_snapshot(file, backup), 1)
+
+    return {"save": save_time, "bytes": written, "load": load_time, "disk": getsize(file)}
+
+
+def bench_shard(data: Dict[int, Any], path: str, change: Callable) -> Dict[str, float]:
+    # One file per group, every save writes the shard of the changed group
+    shard_path = join(path, "shard")
+    backup_path = join(path, "backup")
+    makedirs(shard_path)
+    makedirs(backup_path)
+
+    for gid in data:
+        write_snapshot(join(shard_path, str(gid)), join(backup_path, str(gid)), data[gid])
+
+    gids = []
+
+    def save() -> None:
+        gid = change()
+        gids.append(gid)
+        write_snapshot(join(shard_path, str(gid)), join(backup_path, str(gid)), data[gid])
+
+    save_time = measure(save)
+    written = median(getsize(join(shard_path, str(gid))) for gid in gids)
+    load_time = measure(lambda: load_shards(shard_path, backup_path), 1)
+
+    return {"save": save_time, "bytes": written, "load": load_time, "disk": get_size(shard_path)}
+
+
+def bench_sqlite(data: ScoreTable, path: str, change: Callable) -> Dict[str, float]:
+    # SQLite backend, every save updates a row
+    file = join(path, "storage.db")
+    storage = SQLiteStorage(file, PROJECTS)
+    table = UserTable(storage)
+    table.update(data)
+
+    def save() -> None:
+        uid, project, score = change()
+        table.set_score(uid, project, score)
+
+    # Count the WAL frames appended by the saves, with no checkpoint in between
+    storage.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    storage.execute("PRAGMA wal_autocheckpoint = 0")
+    save_time = measure(save)
+    frames = storage.execute("PRAGMA wal_checkpoint(PASSIVE)")[0][1]
+    storage.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    page_size = storage.execute("PRAGMA page_size")[0][0]
+    written = frames * (page_size + 24) / ROUNDS
+    load_time = measure(lambda: table.copy(), 1)
+
+    return {"save": save_time, "bytes": written, "load": load_time, "disk": get_size(path)}
+
+
+def run_case(case: dict) -> dict:
+    # Run a benchmark case in the current process
+    path = mkdtemp(prefix="tip-bench-")
+    random = Random(case["seed"])
+
+    try:
+        start = perf_counter()
+
+        if case["data"] == "keywords":
+            data = get_keywords(case["size"], case["keywords"], case["seed"])
+            gids = list(data)
+
+            def change() -> int:
+                gid = random.choice(gids)
+                key = random.choice(list(data[gid]["kws"]))
+                data[gid]["kws"][key]["count"] += 1
+                return gid
+        else:
+            data = get_users(case["size"], case["seed"])
+            uids = list(data)
+
+            def change() -> tuple:
+                uid = random.choice(uids)
+                project = random.choice(PROJECTS)
+                score = round(random.random(), 1)
+
+                if case["backend"] != "sqlite":
+                    data.set_score(uid, project, score)
+
+                return uid, project, score
+
+        generate_time = perf_counter() - start
+        result = eval(f"bench_{case['backend']}")(data, path, change)
+        result.update(case)
+        result["generate"] = generate_time
+        result["rss"] = get_rss()
+    finally:
+        rmtree(path, ignore_errors=True)
+
+    return result
+
+
+def get_cases(args: argparse.Namespace) -> List[dict]:
+    # Get the benchmark cases
+    result = []
+
+    for size in args.groups:
+        for backend in ["pickle", "shard"]:
+            result.append({"data": "keywords", "backend": backend, "size": size,
+                           "keywords": args.keywords, "seed": args.seed})
+
+    for size in args.users:
+        for backend in ["pickle", "sqlite"]:
+            result.append({"data": "user_ids", "backend": backend, "size": size,
+                           "keywords": 0, "seed": args.seed})
+
+    return result
+
+
+def get_readable_size(size: float) -> str:
+    # Get a readable size
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+
+        size /= 1024
+
+    return f"{size:.1f} TB"
+
+
+def main() -> None:
+    # Run the benchmark
+    parser = argparse.ArgumentParser(description="Benchmark the persistence of SCP-079-TIP")
+    parser.add_argument("--groups", type=int, nargs="*", default=[1000, 10000, 100000], help="numbers of groups")
+    parser.add_argument("--keywords", type=int, default=100, help="keywords per group")
+    parser.add_argument("--users", type=int, nargs="*", default=[1000000], help="numbers of users")
+    parser.add_argument("--members", type=int, default=100000, help="members of a group")
+    parser.add_argument("--seed", type=int, default=79, help="random seed of the synthetic data")
+    parser.add_argument("--json", type=str, default="", help="also write the results to a JSON file")
+    args = parser.parse_args()
+
+    ratio = check_ids(args.members, args.seed)
+    print(f"member_ids of {args.members} members: the id set is {ratio:.2f}x smaller than a set\n")
+
+    context = get_context("spawn")
+    results = []
+
+    print(f"{'data':<10}{'size':>10} {'backend':<8}{'save':>12}{'bytes/save':>14}{'load':>10}"
+          f"{'on disk':>12}{'peak rss':>12}")
+
+    # Peak RSS per keyword of the largest keywords case that has run
+    per_keyword = 0.0
+
+    for case in get_cases(args):
+        need = per_keyword * case["size"] * case["keywords"]
+        available = get_available()
+
+        if available and need > available:
+            print(f"{case['data']:<10}{case['size']:>10} {case['backend']:<8}"
+                  f"  skipped, needs about {get_readable_size(need)} of memory", flush=True)
+            continue
+
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (case,))
+
+        results.append(result)
+
+        if case["data"] == "keywords" and case["keywords"]:
+            per_keyword = max(per_keyword, result["rss"] / (case["size"] * case["keywords"]))
+
+        print(f"{result['data']:<10}{result['size']:>10} {result['backend']:<8}"
+              f"{result['save'] * 1000:>10.3f}ms{get_readable_size(result['bytes']):>14}"
+              f"{result['load']:>9.3f}s{get_readable_size(result['disk']):>12}"
+              f"{get_readable_size(result['rss']):>12}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
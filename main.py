@@ -27,10 +27,12 @@ from pyrogram import Client, idle
 
 from plugins import glovar
 from plugins.functions.etc import delay
+from plugins.functions.file import save_daemon, save_files
+from plugins.functions.regex import save_counts
 from plugins.functions.timers import (backup_files, interval_min_01, interval_min_10, log_rotation, resend_link,
-                                      reset_count, reset_data, send_count, share_regex_timeout, update_admins,
-                                      update_members, update_pins, update_status)
-from plugins.start import init, renew
+                                      reset_count, reset_data, send_count, share_regex_slow, share_regex_timeout,
+                                      update_admins, update_members, update_pins, update_status)
+from plugins.start import init, preload, renew
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -41,6 +43,9 @@ init()
 # Renew session
 renew()
 
+# Start the persistence daemon
+save_daemon()
+
 # Config session
 app = Client(
     session_name="bot",
@@ -51,6 +56,9 @@ app = Client(
 )
 app.start()
 
+# Load the rest of the data in the background
+preload()
+
 # Send online status
 delay(3, update_status, [app, "online"])
 
@@ -64,6 +72,7 @@ scheduler.add_job(resend_link, "cron", [app], hour=1)
 scheduler.add_job(update_members, "cron", [app], hour=2)
 scheduler.add_job(update_pins, "cron", [app], hour=3)
 scheduler.add_job(share_regex_timeout, "cron", [app], hour=7, minute=10)
+scheduler.add_job(share_regex_slow, "cron", [app], hour=7, minute=20)
 scheduler.add_job(backup_files, "cron", [app], hour=20)
 scheduler.add_job(send_count, "cron", [app], hour=21)
 scheduler.add_job(reset_data, "cron", [app], day=glovar.date_reset, hour=22)
@@ -76,3 +85,7 @@ idle()
 
 # Stop
 app.stop()
+
+# Save changed data
+save_counts()
+save_files()
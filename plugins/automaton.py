@@ -0,0 +1,94 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class Automaton:
+    # Aho-Corasick automaton, find all the words occurring in a text with one scan
+
+    __slots__ = ("fails", "gotos", "outputs")
+
+    def __init__(self, words: Iterable[Tuple[str, Any]] = ()):
+        self.gotos: List[Dict[str, int]] = [{}]
+        self.fails: List[int] = [0]
+        self.outputs: List[Set[Any]] = [set()]
+
+        for word, value in words:
+            word and self.add(word, value)
+
+        self.build()
+
+    def __bool__(self) -> bool:
+        return bool(self.gotos[0])
+
+    def add(self, word: str, value: Any) -> None:
+        state = 0
+
+        for char in word:
+            goto = self.gotos[state]
+            state = goto.get(char)
+
+            if state is None:
+                state = goto[char] = len(self.gotos)
+                self.gotos.append({})
+                self.fails.append(0)
+                self.outputs.append(set())
+
+        self.outputs[state].add(value)
+
+    def build(self) -> None:
+        # Link every state to the longest proper suffix state, merge the outputs of the suffix
+        queue = deque(self.gotos[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, child in self.gotos[state].items():
+                queue.append(child)
+                fail = self.fails[state]
+
+                while fail and char not in self.gotos[fail]:
+                    fail = self.fails[fail]
+
+                fail = self.gotos[fail].get(char, 0)
+                self.fails[child] = fail if fail != child else 0
+                self.outputs[child] |= self.outputs[self.fails[child]]
+
+    def search(self, text: str) -> Set[Any]:
+        # Get the values of all the words occurring in the text
+        result = set()
+
+        gotos = self.gotos
+        fails = self.fails
+        outputs = self.outputs
+        state = 0
+
+        for char in text:
+            while state and char not in gotos[state]:
+                state = fails[state]
+
+            state = gotos[state].get(char, 0)
+            outputs[state] and result.update(outputs[state])
+
+        return result
@@ -174,7 +174,11 @@ def check_mode(values: dict, broken: bool) -> str:
     result = ""
 
     for key in values:
-        if values[key] not in {False, True}:
+        if key == "matcher" and values[key] not in {"local", "process"}:
+            result += f"[ERROR] [mode] {key} - please choose local or process\n"
+        elif key == "storage" and values[key] not in {"pickle", "sqlite"}:
+            result += f"[ERROR] [mode] {key} - please choose pickle or sqlite\n"
+        elif key not in {"matcher", "storage"} and values[key] not in {False, True}:
             result += f"[ERROR] [mode] {key} - please fill a valid boolean value\n"
 
         if not broken or not result:
@@ -0,0 +1,450 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import zlib
+from array import array
+from bisect import bisect_left
+from heapq import heapify, heappop, heappush
+from itertools import accumulate, chain, islice
+from operator import sub
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from .storage import ScoreView
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+def decode_ids(data: bytes) -> array:
+    # Decode the sorted ids from the compressed varint deltas, a corrupt blob raises the error to the loader
+    if not data:
+        return array("q")
+
+    try:
+        deltas = []
+        value = shift = 0
+
+        for byte in zlib.decompress(data):
+            value |= (byte & 0x7F) << shift
+            shift += 7
+
+            if byte & 0x80:
+                continue
+
+            deltas.append(value)
+            value = shift = 0
+
+        if shift or not deltas:
+            raise ValueError("Truncated id data")
+
+        # The first id is zigzag encoded, it may be negative
+        deltas[0] = (deltas[0] >> 1) ^ -(deltas[0] & 1)
+    except Exception as e:
+        logger.error(f"Decode ids error: {e}", exc_info=True)
+        raise
+
+    return array("q", accumulate(deltas))
+
+
+def encode_ids(ids: array) -> bytes:
+    # Encode the sorted ids as compressed varint deltas, a delta of the sparse user ids mostly takes 3 bytes
+    result = b""
+
+    try:
+        if not ids:
+            return result
+
+        first = ids[0] << 1 if ids[0] >= 0 else ~ids[0] << 1 | 1
+        data = bytearray()
+
+        for value in chain([first], map(sub, islice(ids, 1, None), ids)):
+            while value >= 0x80:
+                data.append(value & 0x7F | 0x80)
+                value >>= 7
+
+            data.append(value)
+
+        result = zlib.compress(bytes(data), 9)
+    except Exception as e:
+        logger.warning(f"Encode ids error: {e}", exc_info=True)
+
+    return result
+
+
+def restore_scores(projects: List[str], uids: array, columns: List[array]) -> "ScoreTable":
+    # Restore a score table from the pickled columns
+    result = ScoreTable(projects)
+    order = sorted(range(len(uids)), key=uids.__getitem__)
+    result.index = (array("q", (uids[i] for i in order)), array("I", order))
+    result.columns = dict(zip(projects, columns))
+    result.totals = array("d", map(sum, zip(*columns))) if uids else array("d")
+
+    return result
+
+
+def restore_ids(data: bytes) -> "IdSet":
+    # Restore an id set from the pickled bytes
+    result = IdSet()
+    result.ids = decode_ids(data)
+
+    return result
+
+
+class IdSet:
+    # A compact set of ids, a sorted int64 array with a small buffer for the new ids
+
+    __slots__ = ("buffer", "ids", "lock")
+
+    buffer_size = 256
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.buffer = set()
+        self.ids = array("q", sorted(set(ids)))
+        self.lock = Lock()
+
+    def __contains__(self, the_id: int) -> bool:
+        if the_id in self.buffer:
+            return True
+
+        ids = self.ids
+        i = bisect_left(ids, the_id)
+
+        return i < len(ids) and ids[i] == the_id
+
+    def __iter__(self) -> Iterator[int]:
+        self.flush()
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.buffer)
+
+    def __reduce__(self) -> tuple:
+        self.flush()
+        return restore_ids, (encode_ids(self.ids),)
+
+    def __repr__(self) -> str:
+        return f"IdSet({len(self)} ids)"
+
+    def add(self, the_id: int) -> None:
+        with self.lock:
+            if the_id in self:
+                return
+
+            self.buffer.add(the_id)
+
+        len(self.buffer) >= self.buffer_size and self.flush()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.buffer = set()
+            self.ids = array("q")
+
+    def copy(self) -> Set[int]:
+        return set(self)
+
+    def discard(self, the_id: int) -> None:
+        with self.lock:
+            if the_id in self.buffer:
+                self.buffer.discard(the_id)
+                return
+
+            i = bisect_left(self.ids, the_id)
+
+            if i < len(self.ids) and self.ids[i] == the_id:
+                ids = array("q", self.ids)
+                del ids[i]
+                self.ids = ids
+
+    def flush(self) -> None:
+        # Merge the buffer into the sorted array
+        with self.lock:
+            if not self.buffer:
+                return
+
+            self.ids = array("q", sorted(chain(self.ids, self.buffer)))
+            self.buffer = set()
+
+    def update(self, ids: Iterable[int]) -> None:
+        with self.lock:
+            self.ids = array("q", sorted(set(chain(self.ids, self.buffer, ids))))
+            self.buffer = set()
+
+
+class ScoreTable:
+    # user_ids stored column by column, {uid: {"score": {project: score}}}
+    # The rows are found in the sorted uids, with a small buffer for the new users
+
+    buffer_size = 256
+
+    def __init__(self, projects: Iterable[str]):
+        self.projects = list(projects)
+        self.buffer = {}
+        self.columns = {project: array("d") for project in self.projects}
+        self.free = []
+        self.index = (array("q"), array("I"))
+        self.lock = Lock()
+        self.totals = array("d")
+
+    def __contains__(self, uid: int) -> bool:
+        return self.find_row(uid) is not None
+
+    def __getitem__(self, uid: int) -> Dict[str, ScoreView]:
+        result = self.get(uid)
+
+        if result is None:
+            raise KeyError(uid)
+
+        return result
+
+    def __iter__(self) -> Iterator[int]:
+        with self.lock:
+            self.flush()
+            return iter(self.index[0])
+
+    def __len__(self) -> int:
+        return len(self.index[0]) + len(self.buffer)
+
+    def __reduce__(self) -> tuple:
+        with self.lock:
+            self.flush()
+            uids, rows = self.index
+            columns = [array("d", [self.columns[project][row] for row in rows]) for project in self.projects]
+
+        return restore_scores, (self.projects, uids, columns)
+
+    def __repr__(self) -> str:
+        return f"ScoreTable({len(self)} users)"
+
+    def __setitem__(self, uid: int, value: Dict[str, Dict[str, float]]) -> None:
+        with self.lock:
+            self.set_scores(uid, value)
+            len(self.buffer) >= self.buffer_size and self.flush()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.buffer = {}
+            self.columns = {project: array("d") for project in self.projects}
+            self.free = []
+            self.index = (array("q"), array("I"))
+            self.totals = array("d")
+
+    def copy(self) -> Dict[int, Dict[str, Dict[str, float]]]:
+        return {uid: {"score": self.get_scores(uid)} for uid in self}
+
+    def find_row(self, uid: int) -> Optional[int]:
+        # Find the row of a user in the buffer or in the sorted uids
+        row = self.buffer.get(uid)
+
+        if row is not None:
+            return row
+
+        uids, rows = self.index
+        i = bisect_left(uids, uid)
+
+        if i < len(uids) and uids[i] == uid:
+            return rows[i]
+
+        return None
+
+    def flush(self) -> None:
+        # Merge the buffer into the sorted uids, the caller should hold the lock
+        if not self.buffer:
+            return
+
+        old_uids, old_rows = self.index
+
+        # Sort all the rows again after a bulk update
+        if len(self.buffer) > self.buffer_size:
+            pairs = sorted(chain(zip(old_uids, old_rows), self.buffer.items()))
+            self.index = (array("q", (uid for uid, _ in pairs)), array("I", (row for _, row in pairs)))
+            self.buffer = {}
+            return
+
+        uids, rows = array("q"), array("I")
+        start = 0
+
+        for uid in sorted(self.buffer):
+            i = bisect_left(old_uids, uid, start)
+            uids += old_uids[start:i]
+            rows += old_rows[start:i]
+            uids.append(uid)
+            rows.append(self.buffer[uid])
+            start = i
+
+        uids += old_uids[start:]
+        rows += old_rows[start:]
+        self.index = (uids, rows)
+        self.buffer = {}
+
+    def get(self, uid: int, default: Any = None) -> Any:
+        if uid not in self:
+            return default
+
+        return {"score": ScoreView(self, uid, self.get_scores(uid))}
+
+    def get_row(self, uid: int) -> int:
+        # Get the row of a user, the caller should hold the lock
+        row = self.find_row(uid)
+
+        if row is not None:
+            return row
+
+        if self.free:
+            row = self.free.pop()
+        else:
+            row = len(self.totals)
+
+            for project in self.projects:
+                self.columns[project].append(0.0)
+
+            self.totals.append(0.0)
+
+        self.buffer[uid] = row
+
+        return row
+
+    def get_scores(self, uid: int) -> Dict[str, float]:
+        row = self.find_row(uid)
+
+        if row is None:
+            return {}
+
+        return {project: self.columns[project][row] for project in self.projects}
+
+    def pop(self, uid: int, default: Any = None) -> Any:
+        with self.lock:
+            row = self.buffer.pop(uid, None)
+
+            if row is None:
+                row = self.pop_row(uid)
+
+            if row is None:
+                return default
+
+            result = {"score": {}}
+
+            for project in self.projects:
+                result["score"][project] = self.columns[project][row]
+                self.columns[project][row] = 0.0
+
+            self.totals[row] = 0.0
+            self.free.append(row)
+
+        return result
+
+    def pop_row(self, uid: int) -> Optional[int]:
+        # Remove a user from the sorted uids, the caller should hold the lock
+        uids, rows = self.index
+        i = bisect_left(uids, uid)
+
+        if i >= len(uids) or uids[i] != uid:
+            return None
+
+        result = rows[i]
+        self.index = (uids[:i] + uids[i + 1:], rows[:i] + rows[i + 1:])
+
+        return result
+
+    def set_score(self, uid: int, project: str, score: float) -> None:
+        if project not in self.columns:
+            return
+
+        with self.lock:
+            row = self.get_row(uid)
+            self.columns[project][row] = score
+            self.totals[row] = sum(self.columns[p][row] for p in self.projects)
+            len(self.buffer) >= self.buffer_size and self.flush()
+
+    def set_scores(self, uid: int, value: Dict[str, Dict[str, float]]) -> None:
+        # Set all the scores of a user, the caller should hold the lock
+        scores = value.get("score", {})
+        row = self.get_row(uid)
+        total = 0.0
+
+        for project in self.projects:
+            score = float(scores.get(project, 0.0))
+            self.columns[project][row] = score
+            total += score
+
+        self.totals[row] = total
+
+    def total(self, uid: int) -> float:
+        row = self.find_row(uid)
+
+        if row is None:
+            return 0.0
+
+        return self.totals[row]
+
+    def update(self, data: Any) -> None:
+        # Merge the rows of all the users into the sorted uids once
+        with self.lock:
+            for uid in data:
+                self.set_scores(uid, data[uid])
+
+            self.flush()
+
+
+class WatchList(dict):
+    # The watch dict of a type with an expiry index, {uid: until}
+
+    def __init__(self, data: Dict[int, int] = None):
+        super().__init__(data or {})
+        self.heap = [(until, uid) for uid, until in self.items()]
+        self.lock = Lock()
+        heapify(self.heap)
+
+    def __reduce__(self) -> tuple:
+        return WatchList, (dict(self),)
+
+    def __setitem__(self, uid: int, until: int) -> None:
+        with self.lock:
+            super().__setitem__(uid, until)
+            heappush(self.heap, (until, uid))
+
+            # Drop the outdated index entries of the users that have been watched again
+            if len(self.heap) > 2 * len(self) + 64:
+                self.heap = [(u, i) for i, u in self.items()]
+                heapify(self.heap)
+
+    def clear(self) -> None:
+        with self.lock:
+            super().clear()
+            self.heap = []
+
+    def prune(self, now: int) -> int:
+        # Remove the expired watches, return the number of removed users
+        result = 0
+
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                until, uid = heappop(self.heap)
+
+                if self.get(uid) != until:
+                    continue
+
+                super().pop(uid)
+                result += 1
+
+        return result
+
+    def update(self, data: Dict[int, int]) -> None:
+        for uid in data:
+            self[uid] = data[uid]
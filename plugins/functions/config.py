@@ -30,7 +30,9 @@ from .command import command_error
 from .decorators import threaded
 from .etc import code, code_block, general_link, get_int, get_now, get_text_user, lang, thread
 from .file import delete_file, file_json, file_txt, save
+from .keyword import get_words, update_keywords
 from .markup import get_text_and_markup_tip
+from .regex import is_unsafe_word
 from .telegram import get_group_info, send_document, send_message, send_report_message
 
 # Enable logging
@@ -185,6 +187,9 @@ def kws_add(client: Client, message: Message, gid: int, key: str, text: str, the
         elif len([m for m in modes if m in {"include", "exact", "regex"}]) > 1:
             return command_error(client, message, lang(f"action_kws_{the_type}"), lang("command_para"),
                                  lang("error_kws_modes_conflict"), report=False, private=True)
+        elif "regex" in modes and any(is_unsafe_word(w) for w in get_words(words, False)):
+            return command_error(client, message, lang(f"action_kws_{the_type}"), lang("command_para"),
+                                 lang("error_kws_regex_invalid"), report=False, private=True)
 
         # Get the actions
         actions = {a.strip() for a in text_list[3].split() if a.strip()}
@@ -241,7 +246,8 @@ def kws_add(client: Client, message: Message, gid: int, key: str, text: str, the
             glovar.keywords[gid]["kws"][key]["raw"] = text
         
         # Save the data
-        save("keywords")
+        save("keywords", gid)
+        update_keywords(gid)
 
         # Generate the text and the markup
         group_name, group_link = get_group_info(client, gid)
@@ -306,7 +312,8 @@ def kws_clear(client: Client, message: Message, gid: int) -> bool:
             return False
 
         glovar.keywords[gid]["kws"] = {}
-        save("keywords")
+        save("keywords", gid)
+        update_keywords(gid)
 
         # Send the report message
         send_document(client, cid, file, None, caption, mid)
@@ -335,6 +342,7 @@ def kws_config_occupy(gid: int, uid: int) -> bool:
 
             glovar.keywords[group_id]["lock"] = 0
             glovar.keywords[group_id]["aid"] = 0
+            save("keywords", group_id)
     except Exception as e:
         logger.warning(f"Kws config occupy error: {e}", exc_info=True)
 
@@ -412,7 +420,8 @@ def kws_remove(client: Client, message: Message, gid: int, key: str) -> bool:
 
         # Pop the data
         glovar.keywords[gid]["kws"].pop(key, {})
-        save("keywords")
+        save("keywords", gid)
+        update_keywords(gid)
 
         # Generate the text
         group_name, group_link = get_group_info(client, gid)
@@ -598,7 +607,7 @@ def update_config(client: Client, message: Message, config: dict, more: str = ""
 
         # Update the config
         glovar.configs[gid] = deepcopy(config)
-        save("configs")
+        save("configs", gid)
 
         # Send the report message
         text = (f"{lang('admin_group')}{lang('colon')}{code(aid)}\n"
@@ -0,0 +1,85 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from typing import Any, Dict, Set, Tuple
+
+from pyrogram.types import Message
+
+from .etc import get_forward_name, get_full_name
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class DetectionContext:
+    # The detection data of an update, the normalized texts and the verdicts are computed once
+
+    __slots__ = ("data",)
+
+    def __init__(self):
+        self.data: Dict[tuple, Any] = {}
+        # data = {
+        #     ("texts", "text"): PreparedText,
+        #     ("regex", "ad", "text", False): Match,
+        #     ("ad", "text", False): (0, 26),
+        #     ("emoji", "text"): {"emoji": 1},
+        #     ("kinds",): {"text", "name"},
+        #     ("view",): MessageView
+        # }
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.data
+
+    def get(self, key: tuple, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def set(self, key: tuple, value: Any) -> Any:
+        self.data[key] = value
+        return value
+
+
+class MessageView:
+    # The data of a message used by the keyword detection, the sender class and the texts are computed once
+
+    __slots__ = ("class_c", "equal", "filename", "kinds", "message", "names", "should_pass", "should_pass_terminate",
+                 "text")
+
+    def __init__(self, message: Message, class_c: bool = False, should_pass: bool = False,
+                 should_pass_terminate: bool = False, equal: bool = False, text: str = "", filename: str = "",
+                 kinds: Set[str] = None):
+        self.message = message
+        self.class_c = class_c
+        self.should_pass = should_pass
+        self.should_pass_terminate = should_pass_terminate
+        self.equal = equal
+        self.text = text
+        self.filename = filename
+        self.kinds = kinds or set()
+        # kinds = {"text", "name", "forward", "photo"}
+        self.names: Dict[bool, Tuple[str, str]] = {}
+        # names = {
+        #     False: ("user name", "forward name")
+        # }
+
+    def get_names(self, pure: bool) -> Tuple[str, str]:
+        if pure not in self.names:
+            self.names[pure] = (get_full_name(self.message.from_user, True, pure, pure),
+                                get_forward_name(self.message, True, pure, pure))
+
+        return self.names[pure]
@@ -21,7 +21,7 @@ import json
 import pickle
 from os import remove
 from os.path import exists
-from shutil import copyfile, move
+from shutil import move
 from time import sleep
 from typing import Any
 
@@ -29,6 +29,7 @@ from pyAesCrypt import decryptFile, encryptFile
 from pyrogram import Client
 
 from .. import glovar
+from ..storage import append_journal, delete_journal, get_shards, write_snapshot
 from .decorators import threaded
 from .etc import random_str
 from .telegram import download_media
@@ -173,8 +174,76 @@ def move_file(src: str, dst: str) -> bool:
     return result
 
 
-@threaded(daemon=False)
-def save(file: str) -> bool:
+def save(file: str, gid: int = 0) -> bool:
+    # Mark a global variable as changed, the persistence daemon will save it later
+    result = False
+
+    try:
+        with glovar.locks["save"]:
+            if gid and file in glovar.shard_list:
+                glovar.saved_shards.setdefault(file, set()).add(gid)
+            else:
+                glovar.saved_files.add(file)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Save {file} error: {e}", exc_info=True)
+
+    return result
+
+
+def save_count(file: str, keys: tuple, fields: tuple = ("count", "today")) -> bool:
+    # Increase the counters of a global variable, only append the change to the journal
+    result = False
+
+    glovar.locks["journal"].acquire()
+
+    try:
+        data = eval(f"glovar.{file}")
+
+        for key in keys:
+            data = data[key]
+
+        for field in fields:
+            if field not in data:
+                continue
+
+            data[field] += 1
+
+        # The per-group data has one journal per group
+        if file in glovar.shard_list:
+            journal = f"{file}.{keys[0]}"
+        else:
+            journal = file
+
+        append_journal(f"{glovar.PICKLE_JOURNAL_PATH}/{journal}", keys, fields)
+        glovar.journaled_files.add(journal)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Save count {file} error: {e}", exc_info=True)
+    finally:
+        glovar.locks["journal"].release()
+
+    return result
+
+
+@threaded()
+def save_daemon() -> bool:
+    # Save changed global variables periodically
+    result = False
+
+    try:
+        while True:
+            sleep(glovar.time_save)
+            save_files()
+    except Exception as e:
+        logger.warning(f"Save daemon error: {e}", exc_info=True)
+
+    return result
+
+
+def save_file(file: str) -> bool:
     # Save a global variable to a file
     result = False
 
@@ -182,15 +251,99 @@ def save(file: str) -> bool:
         if not glovar:
             return False
 
-        with open(f"{glovar.PICKLE_BACKUP_PATH}/{file}", "wb") as f:
-            pickle.dump(eval(f"glovar.{file}"), f)
+        # The data in the SQLite backend is updated row by row
+        if file in glovar.storage_list:
+            return True
 
-        result = copyfile(f"{glovar.PICKLE_BACKUP_PATH}/{file}", f"{glovar.PICKLE_PATH}/{file}")
+        # Save every shard of the per-group data, remove the shards of the groups that have been popped
+        if file in glovar.shard_list:
+            gids = set(eval(f"glovar.{file}")) | get_shards(f"{glovar.PICKLE_SHARD_PATH}/{file}")
+            gids |= {int(j.split(".", 1)[1]) for j in list(glovar.journaled_files) if j.startswith(f"{file}.")}
+
+            for gid in gids:
+                save_shard(file, gid)
+
+            return True
+
+        # The snapshot contains all the changes in the journal, so fold the journal into it
+        with glovar.locks["journal"]:
+            result = write_snapshot(f"{glovar.PICKLE_PATH}/{file}", f"{glovar.PICKLE_BACKUP_PATH}/{file}",
+                                    eval(f"glovar.{file}"))
+
+            if file in glovar.journaled_files:
+                delete_journal(f"{glovar.PICKLE_JOURNAL_PATH}/{file}")
+                glovar.journaled_files.discard(file)
     except RuntimeError:
-        sleep(1)
-        return save(file)
+        save(file)
     except Exception as e:
-        logger.warning(f"Save {file} error: {e}", exc_info=True)
+        logger.warning(f"Save file {file} error: {e}", exc_info=True)
+
+    return result
+
+
+def save_files() -> bool:
+    # Save all changed global variables to files
+    result = False
+
+    glovar.locks["file"].acquire()
+
+    try:
+        with glovar.locks["save"]:
+            file_list = glovar.saved_files
+            glovar.saved_files = set()
+            shard_dict = glovar.saved_shards
+            glovar.saved_shards = {}
+
+        for file in file_list:
+            save_file(file)
+
+        # Only write the shards of the groups changed since the last flush
+        for file in shard_dict:
+            if file in file_list:
+                continue
+
+            for gid in shard_dict[file]:
+                save_shard(file, gid)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Save files error: {e}", exc_info=True)
+    finally:
+        glovar.locks["file"].release()
+
+    return result
+
+
+def save_shard(file: str, gid: int) -> bool:
+    # Save a group's shard of a global variable to a file
+    result = False
+
+    try:
+        if not glovar:
+            return False
+
+        path = f"{glovar.PICKLE_SHARD_PATH}/{file}/{gid}"
+        backup_path = f"{glovar.PICKLE_SHARD_BACKUP_PATH}/{file}/{gid}"
+
+        with glovar.locks["journal"]:
+            data = eval(f"glovar.{file}").get(gid)
+
+            if data is None:
+                delete_file(path)
+                delete_file(backup_path)
+                result = True
+            else:
+                result = write_snapshot(path, backup_path, data)
+
+            journal = f"{file}.{gid}"
+
+            if journal in glovar.journaled_files:
+                delete_journal(f"{glovar.PICKLE_JOURNAL_PATH}/{journal}")
+                glovar.journaled_files.discard(journal)
+    except RuntimeError:
+        save(file, gid)
+    except Exception as e:
+        logger.warning(f"Save shard {file} {gid} error: {e}", exc_info=True)
 
     return result
 
@@ -204,6 +357,7 @@ def save_regex_timeout(word: str) -> bool:
     try:
         glovar.timeout_words.add(word)
         save("timeout_words")
+
         result = True
     except Exception as e:
         logger.warning(f"Save regex timeout error: {e}", exc_info=True)
@@ -17,18 +17,21 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-import re
 from copy import deepcopy
 from string import ascii_lowercase
-from typing import Match, Optional, Union
+from time import perf_counter
+from typing import Dict, Match, Optional, Pattern, Set, Union
 
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, Message, User
 
 from .. import glovar
+from .context import DetectionContext, MessageView
 from .etc import get_filename, get_forward_name, get_full_name, get_now, get_text, t2t
-from .file import save, save_regex_timeout
+from .file import save_regex_timeout
 from .ids import init_group_id
+from .keyword import get_keyword_index, get_words
+from .regex import PreparedText, count_word, exclude_word, get_compiled, profile_word
 from .telegram import get_user_full
 
 # Enable logging
@@ -294,75 +297,241 @@ test_group = filters.create(
 )
 
 
-def get_words(words: set, exact: bool) -> dict:
-    # Get words dict
+def get_ad_mask(text: str, ocr: bool, matched: str = "", context: DetectionContext = None) -> int:
+    # Get the bitmask of the ad rule families the text hit, bit 0 is ada, bit 25 is adz
+    # The families are checked in order, and the check stops at the first hit other than the matched family
+    result = 0
+
+    try:
+        if not text:
+            return 0
+
+        checked = 0
+
+        if context and ("ad", text, ocr) in context:
+            result, checked = context.get(("ad", text, ocr))
+
+        skip = 1 << ascii_lowercase.index(matched) if matched else 0
+
+        if result & ~skip or checked == len(ascii_lowercase):
+            return result
+
+        texts = get_regex_texts(text, context)
+
+        for i in range(checked, len(ascii_lowercase)):
+            checked = i + 1
+
+            if not is_regex_texts(f"ad{ascii_lowercase[i]}", texts, ocr):
+                continue
+
+            result |= 1 << i
+
+            if ascii_lowercase[i] != matched:
+                break
+
+        if context:
+            context.set(("ad", text, ocr), (result, checked))
+    except Exception as e:
+        logger.warning(f"Get ad mask error: {e}", exc_info=True)
+
+    return result
+
+
+def get_emoji_dict(text: str, context: DetectionContext = None) -> Dict[str, int]:
+    # Get the count of each emoji in the text
     result = {}
 
     try:
-        for word in words:
-            if word.startswith("{{") and word.endswith("}}"):
-                word = word[2:-2]
+        if context and ("emoji", text) in context:
+            return context.get(("emoji", text))
 
-                if not word:
-                    continue
+        emoji_set = {emoji for emoji in glovar.emoji_set if emoji in text and emoji not in glovar.emoji_protect}
+        emoji_old_set = deepcopy(emoji_set)
 
-                result[word] = True
-            elif exact:
-                result[word] = True
-            else:
-                result[word] = False
+        for emoji in emoji_old_set:
+            if any(emoji in emoji_old and emoji != emoji_old for emoji_old in emoji_old_set):
+                emoji_set.discard(emoji)
+
+        for emoji in emoji_set:
+            result[emoji] = text.count(emoji)
+
+        if context:
+            context.set(("emoji", text), result)
     except Exception as e:
-        logger.warning(f"Get words error: {e}", exc_info=True)
+        logger.warning(f"Get emoji dict error: {e}", exc_info=True)
 
     return result
 
 
-def is_ad_text(text: str, ocr: bool, matched: str = "") -> str:
-    # Check if the text is ad text
-    result = ""
+def get_message_kinds(message: Message, context: DetectionContext = None) -> Set[str]:
+    # Get the kinds of the message, used to dispatch the keywords
+    result = set()
+
+    try:
+        if context and ("kinds",) in context:
+            return context.get(("kinds",))
+
+        # The kinds of the texts
+        if message.text or message.caption:
+            result.add("text")
+
+        if message.from_user:
+            result.add("name")
+
+        if message.new_chat_members:
+            result.add("join")
+
+        if (message.document and message.document.file_name) or (message.audio and message.audio.file_name):
+            result.add("filename")
+
+        # The kinds of the messages
+        if message.forward_date:
+            result.add("forward")
+
+        if message.forward_from or message.forward_sender_name:
+            result.add("user")
+
+        if message.forward_from_chat:
+            result.add("channel")
+
+        if message.forward_from_chat and message.from_user and message.from_user.id == 777000:
+            result.add("discuss")
+
+        if message.reply_to_message:
+            result.add("reply")
+
+        if message.left_chat_member:
+            result.add("leave")
+
+        if message.edit_date:
+            result.add("edit")
+
+        if message.game_high_score:
+            result.add("score")
+
+        if any(en.type in {"url", "text_link"} for en in (message.entities or message.caption_entities or [])):
+            result.add("url")
+
+        result |= {kind for kind in ["mentioned", "service", "media", "audio", "document", "photo", "sticker",
+                                     "animation", "game", "video", "voice", "video_note", "caption", "contact",
+                                     "location", "venue", "web_page", "poll", "dice", "via_bot", "reply_markup"]
+                   if getattr(message, kind, None)}
+
+        if context:
+            context.set(("kinds",), result)
+    except Exception as e:
+        logger.warning(f"Get message kinds error: {e}", exc_info=True)
+
+    return result
+
+
+def get_message_view(message: Message, context: DetectionContext = None) -> MessageView:
+    # Get the data of the message used by the keyword detection
+    result = MessageView(message)
+
+    try:
+        if context and ("view",) in context:
+            return context.get(("view",))
+
+        gid = message.chat.id
+        result = MessageView(
+            message=message,
+            class_c=is_class_c(None, None, message),
+            should_pass=is_should_pass(message, False),
+            should_pass_terminate=is_should_pass(message, True),
+            equal=glovar.configs[gid].get("equal", False),
+            text=get_text(message, True),
+            filename=get_filename(message, True),
+            kinds=get_message_kinds(message, context)
+        )
+
+        if context:
+            context.set(("view",), result)
+    except Exception as e:
+        logger.warning(f"Get message view error: {e}", exc_info=True)
+
+    return result
+
+
+def get_regex_texts(text: str, context: DetectionContext = None) -> PreparedText:
+    # Get the texts used by the regex rules, the normalized text and the text without spaces
+    result = PreparedText()
 
     try:
         if not text:
-            return ""
+            return result
+
+        if context and ("texts", text) in context:
+            return context.get(("texts", text))
+
+        result = PreparedText(text)
+
+        if context:
+            context.set(("texts", text), result)
+    except Exception as e:
+        logger.warning(f"Get regex texts error: {e}", exc_info=True)
+
+    return result
+
 
-        for c in ascii_lowercase:
+def is_ad_mask(mask: int, matched: str = "") -> str:
+    # Get the first ad rule family in the bitmask
+    result = ""
+
+    try:
+        for i, c in enumerate(ascii_lowercase):
             if c == matched:
                 continue
 
-            if not is_regex_text(f"ad{c}", text, ocr):
+            if not mask & (1 << i):
                 continue
 
             result = c
             break
+    except Exception as e:
+        logger.warning(f"Is ad mask error: {e}", exc_info=True)
+
+    return result
+
+
+def is_ad_text(text: str, ocr: bool, matched: str = "", context: DetectionContext = None) -> str:
+    # Check if the text is ad text
+    result = ""
+
+    try:
+        if not text:
+            return ""
+
+        result = is_ad_mask(get_ad_mask(text, ocr, matched, context), matched)
     except Exception as e:
         logger.warning(f"Is ad text error: {e}", exc_info=True)
 
     return result
 
 
-def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
+def is_ban_text(text: str, ocr: bool, message: Message = None, context: DetectionContext = None) -> bool:
     # Check if the text is ban text
     result = False
 
     try:
-        if is_regex_text("ban", text, ocr):
+        if is_regex_text("ban", text, ocr, context):
             return True
 
         # ad + con
-        ad = is_regex_text("ad", text, ocr)
-        con = is_con_text(text, ocr)
+        ad = is_regex_text("ad", text, ocr, context)
+        con = is_con_text(text, ocr, context)
 
         if ad and con:
             return True
 
         # emoji + con
-        emoji = is_emoji("ad", text, message)
+        emoji = is_emoji("ad", text, message, context)
 
         if emoji and con:
             return True
 
         # ad_ + con
-        ad = is_ad_text(text, ocr)
+        ad = is_ad_mask(get_ad_mask(text, ocr, "", context))
 
         if ad and con:
             return True
@@ -375,7 +544,7 @@ def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
         if not ad:
             return False
 
-        ad = is_ad_text(text, ocr, ad)
+        ad = is_ad_mask(get_ad_mask(text, ocr, ad, context), ad)
         result = bool(ad)
     except Exception as e:
         logger.warning(f"Is ban text error: {e}", exc_info=True)
@@ -383,13 +552,13 @@ def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
     return result
 
 
-def is_bio_text(text: str) -> bool:
+def is_bio_text(text: str, context: DetectionContext = None) -> bool:
     # Check if the text is bio text
     result = False
 
     try:
-        if (is_regex_text("bio", text)
-                or is_ban_text(text, False)):
+        if (is_regex_text("bio", text, False, context)
+                or is_ban_text(text, False, None, context)):
             return True
     except Exception as e:
         logger.warning(f"Is bio text error: {e}", exc_info=True)
@@ -436,14 +605,14 @@ def is_class_e_user(user: Union[int, User]) -> bool:
     return result
 
 
-def is_con_text(text: str, ocr: bool) -> bool:
+def is_con_text(text: str, ocr: bool, context: DetectionContext = None) -> bool:
     # Check if the text is con text
     result = False
 
     try:
-        if (is_regex_text("con", text, ocr)
-                or is_regex_text("iml", text, ocr)
-                or is_regex_text("pho", text, ocr)):
+        if (is_regex_text("con", text, ocr, context)
+                or is_regex_text("iml", text, ocr, context)
+                or is_regex_text("pho", text, ocr, context)):
             return True
     except Exception as e:
         logger.warning(f"Is con text error: {e}", exc_info=True)
@@ -463,7 +632,7 @@ def is_declared_message_id(gid: int, mid: int) -> bool:
     return result
 
 
-def is_emoji(the_type: str, text: str, message: Message = None) -> bool:
+def is_emoji(the_type: str, text: str, message: Message = None, context: DetectionContext = None) -> bool:
     # Check the emoji type
     result = False
 
@@ -471,16 +640,7 @@ def is_emoji(the_type: str, text: str, message: Message = None) -> bool:
         if message:
             text = get_text(message)
 
-        emoji_dict = {}
-        emoji_set = {emoji for emoji in glovar.emoji_set if emoji in text and emoji not in glovar.emoji_protect}
-        emoji_old_set = deepcopy(emoji_set)
-
-        for emoji in emoji_old_set:
-            if any(emoji in emoji_old and emoji != emoji_old for emoji_old in emoji_old_set):
-                emoji_set.discard(emoji)
-
-        for emoji in emoji_set:
-            emoji_dict[emoji] = text.count(emoji)
+        emoji_dict = get_emoji_dict(text, context)
 
         # Check ad
         if the_type == "ad":
@@ -521,12 +681,10 @@ def is_high_score_user(user: Union[int, User], high: bool = True) -> float:
         else:
             uid = user.id
 
-        user_status = glovar.user_ids.get(uid, {})
-
-        if not user_status:
+        if uid not in glovar.user_ids:
             return 0.0
 
-        score = sum(user_status["score"].values())
+        score = glovar.user_ids.total(uid)
 
         if not high:
             return score
@@ -539,7 +697,7 @@ def is_high_score_user(user: Union[int, User], high: bool = True) -> float:
     return result
 
 
-def is_keyword_message(message: Message) -> dict:
+def is_keyword_message(message: Message, context: DetectionContext = None) -> dict:
     # Check if the message includes keywords
     result = {}
 
@@ -562,34 +720,54 @@ def is_keyword_message(message: Message) -> dict:
         if not keywords:
             return {}
 
+        # Get the message data shared by all the keywords
+        view = get_message_view(message, context)
+
+        # Get the keys targeting the kinds of the message
+        index = get_keyword_index(gid)
+        keys = index.get_keys(view.kinds)
+
+        if not keys:
+            return {}
+
+        # Get the keys whose words occur in the texts they match
+        texts = [view.text, view.filename]
+
+        if index.kinds.get("name", set()) & keys or index.kinds.get("join", set()) & keys:
+            texts += [name for pure in [False, True] for name in view.get_names(pure)]
+
         # Loop keywords
-        for key in keywords:
+        for key in index.search(keys, *texts):
+            # The index may be older than the keywords, skip the removed keys
+            keyword = keywords.get(key)
+
+            if keyword is None:
+                continue
+
             # Config data
-            modes = keywords[key]["modes"]
-            actions = keywords[key]["actions"]
-            target = keywords[key]["target"]
-            class_c_message = is_class_c(None, None, message)
-            should_pass = is_should_pass(message, False)
-            should_pass_terminate = is_should_pass(message, True)
+            modes = keyword["modes"]
+            actions = keyword["actions"]
+            target = keyword["target"]
 
             # Check target
-            if target == "member" and class_c_message:
+            if target == "member" and view.class_c:
                 continue
-            elif target == "admin" and not class_c_message:
+            elif target == "admin" and not view.class_c:
                 continue
-            elif is_terminate_actions(actions) and is_should_pass(message):
+            elif is_terminate_actions(actions) and view.should_pass:
                 continue
 
             # Get result
-            if ((should_pass_terminate and "name" in modes and "forward" not in modes and not message.forward_date)
-                    or (should_pass and "forward" in modes)):
+            if view.should_pass_terminate and "name" in modes and "forward" not in modes and not message.forward_date:
+                continue
+            elif view.should_pass and "forward" in modes:
                 continue
             elif "name" in modes or "join" in modes:
-                result = is_keyword_name(message, key)
+                result = is_keyword_name(view, key)
             elif "forward" in modes:
-                result = is_keyword_text(message, key, True)
+                result = is_keyword_text(view, key, True)
             else:
-                result = is_keyword_text(message, key)
+                result = is_keyword_text(view, key)
 
             # Check result
             if result:
@@ -600,12 +778,13 @@ def is_keyword_message(message: Message) -> dict:
     return result
 
 
-def is_keyword_name(message: Message, key: str) -> dict:
+def is_keyword_name(view: MessageView, key: str) -> dict:
     # Check if the message's sender name includes keywords
     result = {}
 
     try:
         # Basic data
+        message = view.message
         gid = message.chat.id
         match = ""
 
@@ -630,8 +809,7 @@ def is_keyword_name(message: Message, key: str) -> dict:
             return {}
 
         # Get names
-        user_name = get_full_name(message.from_user, True, pure, pure)
-        forward_name = get_forward_name(message, True, pure, pure)
+        user_name, forward_name = view.get_names(pure)
 
         # Check the forward name
         if forward and not forward_name:
@@ -639,6 +817,7 @@ def is_keyword_name(message: Message, key: str) -> dict:
 
         # Get words
         words = get_words(keyword["words"], exact)
+        patterns = get_keyword_index(gid).patterns.get(key, {})
 
         # Get name list
         if forward:
@@ -652,7 +831,7 @@ def is_keyword_name(message: Message, key: str) -> dict:
                 continue
 
             for word in words:
-                match = is_keyword_string(word, name, words[word], case, regex)
+                match = is_keyword_string(word, name, words[word], case, regex, patterns.get(word))
 
                 if match:
                     break
@@ -680,7 +859,7 @@ def is_keyword_name(message: Message, key: str) -> dict:
     return result
 
 
-def is_keyword_string(word: str, text: str, exact: bool, case: bool, regex: bool) -> str:
+def is_keyword_string(word: str, text: str, exact: bool, case: bool, regex: bool, pattern: Pattern = None) -> str:
     # Check if the keyword match the string
     result = ""
 
@@ -691,7 +870,14 @@ def is_keyword_string(word: str, text: str, exact: bool, case: bool, regex: bool
         text = text.strip()
         origin = word
 
-        if regex:
+        # Search the compiled regex with the deadline of the regex rules
+        if regex and pattern:
+            try:
+                return origin if is_regex_string(pattern, text) else ""
+            except TimeoutError:
+                logger.warning(f"Keyword regex {word} timeout")
+                return ""
+        elif regex:
             return ""
 
         if not case:
@@ -708,15 +894,16 @@ def is_keyword_string(word: str, text: str, exact: bool, case: bool, regex: bool
     return result
 
 
-def is_keyword_text(message: Message, key: str, forward: bool = False) -> dict:
+def is_keyword_text(view: MessageView, key: str, forward: bool = False) -> dict:
     # Check if the message includes keywords
     result = {}
 
     try:
         # Basic data
+        message = view.message
         gid = message.chat.id
         mid = None
-        class_c_message = is_class_c(None, None, message)
+        class_c_message = view.class_c
         match = ""
 
         # Check the message
@@ -731,7 +918,7 @@ def is_keyword_text(message: Message, key: str, forward: bool = False) -> dict:
             return {}
 
         # Get config
-        equal_mode = glovar.configs[gid].get("equal", False)
+        equal_mode = view.equal
 
         # Get modes
         modes = keyword["modes"]
@@ -740,7 +927,7 @@ def is_keyword_text(message: Message, key: str, forward: bool = False) -> dict:
         regex = "regex" in modes
 
         # Get text
-        message_text = get_text(message, True)
+        message_text = view.filename if "filename" in modes else view.text
 
         # Check the text
         if not message_text:
@@ -748,10 +935,11 @@ def is_keyword_text(message: Message, key: str, forward: bool = False) -> dict:
 
         # Get words
         words = get_words(keyword["words"], exact)
+        patterns = get_keyword_index(gid).patterns.get(key, {})
 
         # Get match result
         for word in words:
-            match = is_keyword_string(word, message_text, words[word], case, regex)
+            match = is_keyword_string(word, message_text, words[word], case, regex, patterns.get(word))
 
             if match and not equal_mode and class_c_message and regex and message_text.lower() != word.lower():
                 match = ""
@@ -801,14 +989,14 @@ def is_keyworded_user(gid: int, key: str, uid: int) -> bool:
     return result
 
 
-def is_nm_text(text: str) -> bool:
+def is_nm_text(text: str, context: DetectionContext = None) -> bool:
     # Check if the text is nm text
     result = False
 
     try:
-        if (is_regex_text("nm", text)
-                or is_regex_text("bio", text)
-                or is_ban_text(text, False)):
+        if (is_regex_text("nm", text, False, context)
+                or is_regex_text("bio", text, False, context)
+                or is_ban_text(text, False, None, context)):
             return True
     except Exception as e:
         logger.warning(f"Is nm text error: {e}", exc_info=True)
@@ -816,7 +1004,7 @@ def is_nm_text(text: str) -> bool:
     return result
 
 
-def is_nospam_message(message: Message) -> bool:
+def is_nospam_message(message: Message, context: DetectionContext = None) -> bool:
     # Check if the message will be processed by NOSPAM
     result = False
 
@@ -831,34 +1019,34 @@ def is_nospam_message(message: Message) -> bool:
         # Check the forward from name
         forward_name = get_forward_name(message, True, True, True)
 
-        if forward_name and is_nm_text(forward_name):
+        if forward_name and is_nm_text(forward_name, context):
             return True
 
         # Check the user's name
         name = get_full_name(message.from_user, True, True, True)
 
-        if name and is_nm_text(name):
+        if name and is_nm_text(name, context):
             return True
 
         # Check the text
         message_text = get_text(message, True, True)
 
-        if is_ban_text(message_text, False):
+        if is_ban_text(message_text, False, None, context):
             return True
 
-        if is_regex_text("del", message_text):
+        if is_regex_text("del", message_text, False, context):
             return True
 
         # File name
         filename = get_filename(message, True, True)
 
-        if is_ban_text(filename, False):
+        if is_ban_text(filename, False, None, context):
             return True
 
-        if is_regex_text("fil", filename):
+        if is_regex_text("fil", filename, False, context):
             return True
 
-        if is_regex_text("del", filename):
+        if is_regex_text("del", filename, False, context):
             return True
     except Exception as e:
         logger.warning(f"Is nospam message error: {e}", exc_info=True)
@@ -866,7 +1054,7 @@ def is_nospam_message(message: Message) -> bool:
     return result
 
 
-def is_nospam_join(client: Client, gid: int, user: User) -> bool:
+def is_nospam_join(client: Client, gid: int, user: User, context: DetectionContext = None) -> bool:
     # Check if the joined message will be processed by NOSPAM
     result = False
 
@@ -885,7 +1073,7 @@ def is_nospam_join(client: Client, gid: int, user: User) -> bool:
         # Check name
         name = get_full_name(user, True, True, True)
 
-        if name and is_nm_text(name):
+        if name and is_nm_text(name, context):
             return True
 
         # Check bio
@@ -896,7 +1084,7 @@ def is_nospam_join(client: Client, gid: int, user: User) -> bool:
         else:
             bio = t2t(user.about, True, True, True)
 
-        if bio and is_bio_text(bio):
+        if bio and is_bio_text(bio, context):
             return True
     except Exception as e:
         logger.warning(f"Is nospam join error: {e}", exc_info=True)
@@ -922,75 +1110,121 @@ def is_user_class_d(gid: int, user: User) -> bool:
     return result
 
 
-def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = False) -> Optional[Match]:
+def is_regex_text(word_type: str, text: str, ocr: bool = False,
+                  context: DetectionContext = None) -> Optional[Match]:
     # Check if the text hit the regex rules
     result = None
 
     try:
-        if text:
-            if not again:
-                text = re.sub(r"\s{2,}", " ", text)
-            elif " " in text:
-                text = re.sub(r"\s", "", text)
-            else:
-                return None
-        else:
+        if not text:
             return None
 
-        with glovar.locks["regex"]:
-            words = list(eval(f"glovar.{word_type}_words"))
+        if context and ("regex", word_type, text, ocr) in context:
+            return context.get(("regex", word_type, text, ocr))
 
-        for word in words:
-            if word in glovar.timeout_words:
-                continue
+        result = is_regex_texts(word_type, get_regex_texts(text, context), ocr)
+
+        if context:
+            context.set(("regex", word_type, text, ocr), result)
+    except Exception as e:
+        logger.warning(f"Is regex text error: {e}", exc_info=True)
+
+    return result
+
+
+def is_regex_texts(word_type: str, texts: PreparedText, ocr: bool = False) -> Optional[Match]:
+    # Check if the prepared texts hit the regex rules, try the text without spaces again
+    result = None
+
+    try:
+        for text, folded in texts:
+            result = is_regex_words(word_type, text, folded, ocr)
+
+            if result:
+                return result
+    except Exception as e:
+        logger.warning(f"Is regex texts error: {e}", exc_info=True)
 
-            if ocr and "(?# nocr)" in word:
+    return result
+
+
+def is_regex_words(word_type: str, text: str, folded: str, ocr: bool) -> Optional[Match]:
+    # Check if the prepared text hit the regex rules of a word type
+    result = None
+
+    try:
+        # Only the rules whose literals occur in the text can match it
+        rules = get_compiled(word_type)
+        patterns = rules.get_candidates(folded)
+
+        # Scan the text once with the union of the rules without literals
+        union = rules.get_union(ocr)
+
+        try:
+            result = union and is_regex_string(union, text, word_type)
+
+            if result:
+                count_word(word_type, rules.names[result.lastgroup])
+                return result
+
+            patterns += rules.fallback
+        except TimeoutError:
+            patterns += rules.always
+
+        # Match the rest of the rules one by one
+        for word, pattern in patterns:
+            if ocr and word in rules.nocr:
                 continue
 
             try:
-                result = is_regex_string(word, text)
+                result = is_regex_string(pattern, text, word_type, word)
             except TimeoutError:
-                save_regex_timeout(word)
+                save_regex_timeout(word) and exclude_word(word)
 
             # Count and return
             if not result:
                 continue
 
-            count = eval(f"glovar.{word_type}_words").get(word, 0)
-            count += 1
-            eval(f"glovar.{word_type}_words")[word] = count
-            save(f"{word_type}_words")
+            count_word(word_type, word)
 
             return result
-
-        # Try again
-        return is_regex_text(word_type, text, ocr, True)
     except Exception as e:
-        logger.warning(f"Is regex text error: {e}", exc_info=True)
+        logger.warning(f"Is regex words error: {e}", exc_info=True)
 
     return result
 
 
-def is_regex_string(word: str, text: str) -> Optional[Match]:
-    # Check if the text hit the regex rules
+def is_regex_string(pattern: Pattern, text: str, word_type: str = "", word: str = "") -> Optional[Match]:
+    # Check if the text hit the regex rules, raise TimeoutError if the search is too slow
     result = None
 
+    begin = perf_counter()
+
     try:
-        begin = get_now()
-        result = re.search(word, text, re.I | re.S | re.M)
-        end = get_now()
+        # Search in a matcher process, it is killed when the deadline is exceeded
+        if glovar.matcher_pool:
+            return glovar.matcher_pool.search(pattern, text, glovar.time_regex)
+
+        # The local search can not be stopped, a slow rule is only excluded after it returns
+        result = pattern.search(text)
 
-        if end - begin < 5:
+        if perf_counter() - begin < glovar.time_regex:
             return result
 
         raise TimeoutError
+    except TimeoutError:
+        raise
     except Exception as e:
         logger.warning(f"Is regex string error: {e}", exc_info=True)
+    finally:
+        # Profile the rules if it is enabled, the timed out searches are recorded too
+        if glovar.profile and word_type:
+            profile_word(word_type, word, perf_counter() - begin)
 
     return result
 
 
-def is_rm_text(message: Message) -> bool:
+def is_rm_text(message: Message, context: DetectionContext = None) -> bool:
     # Check if the text is rm text
     result = False
 
@@ -1010,7 +1244,7 @@ def is_rm_text(message: Message) -> bool:
         message_text = get_text(message)
 
         # Check the message_text
-        if not is_regex_text("rm", message_text):
+        if not is_regex_text("rm", message_text, False, context):
             return False
 
         result = True
@@ -1100,21 +1334,20 @@ def is_watch_user(user: Union[int, User], the_type: str, now: int = 0) -> bool:
     return result
 
 
-def is_wb_text(text: str, ocr: bool) -> bool:
+def is_wb_text(text: str, ocr: bool, context: DetectionContext = None) -> bool:
     # Check if the text is wb text
     result = False
 
     try:
-        if (is_regex_text("wb", text, ocr)
-                or is_regex_text("ad", text, ocr)
-                or is_regex_text("iml", text, ocr)
-                or is_regex_text("pho", text, ocr)
-                or is_regex_text("sho", text, ocr)
-                or is_regex_text("spc", text, ocr)):
+        if (is_regex_text("wb", text, ocr, context)
+                or is_regex_text("ad", text, ocr, context)
+                or is_regex_text("iml", text, ocr, context)
+                or is_regex_text("pho", text, ocr, context)
+                or is_regex_text("sho", text, ocr, context)
+                or is_regex_text("spc", text, ocr, context)):
             return True
 
-        result = any(c not in {"i"} and is_regex_text(f"ad{c}", text, ocr)
-                     for c in ascii_lowercase)
+        result = bool(is_ad_mask(get_ad_mask(text, ocr, "i", context), "i"))
     except Exception as e:
         logger.warning(f"Is wb text error: {e}", exc_info=True)
 
@@ -137,10 +137,10 @@ def leave_group(client: Client, gid: int, reason: str = "") -> bool:
         save("flooded_ids")
 
         glovar.member_ids.pop(gid, set())
-        save("member_ids")
+        save("member_ids", gid)
 
         glovar.message_ids.pop(gid, {})
-        save("message_ids")
+        save("message_ids", gid)
 
         glovar.pinned_ids.pop(gid, 0)
         save("pinned_ids")
@@ -149,22 +149,23 @@ def leave_group(client: Client, gid: int, reason: str = "") -> bool:
         save("trust_ids")
 
         glovar.channels.pop(gid, {})
-        save("channels")
+        save("channels", gid)
 
         glovar.configs.pop(gid, {})
-        save("configs")
+        save("configs", gid)
 
         glovar.keywords.pop(gid, {})
-        save("keywords")
+        save("keywords", gid)
+        glovar.keyword_indexes.pop(gid, None)
 
         glovar.ots.pop(gid, {})
-        save("ots")
+        save("ots", gid)
 
         glovar.rms.pop(gid, {})
-        save("rms")
+        save("rms", gid)
 
         glovar.welcomes.pop(gid, {})
-        save("welcomes")
+        save("welcomes", gid)
 
         glovar.chats.pop(gid, None)
         glovar.declared_message_ids.pop(gid, set())
@@ -20,6 +20,7 @@ import logging
 from copy import deepcopy
 
 from .. import glovar
+from ..containers import IdSet
 from .file import save
 
 # Enable logging
@@ -45,12 +46,12 @@ def init_group_id(gid: int) -> bool:
             save("admin_ids")
 
         if glovar.member_ids.get(gid) is None:
-            glovar.member_ids[gid] = set()
-            save("member_ids")
+            glovar.member_ids[gid] = IdSet()
+            save("member_ids", gid)
 
         if glovar.message_ids.get(gid) is None:
             glovar.message_ids[gid] = deepcopy(glovar.default_message_data)
-            save("message_ids")
+            save("message_ids", gid)
 
         if glovar.trust_ids.get(gid) is None:
             glovar.trust_ids[gid] = set()
@@ -58,27 +59,27 @@ def init_group_id(gid: int) -> bool:
 
         if glovar.channels.get(gid) is None:
             glovar.channels[gid] = deepcopy(glovar.default_channel_data)
-            save("channels")
+            save("channels", gid)
 
         if glovar.configs.get(gid) is None:
             glovar.configs[gid] = deepcopy(glovar.default_config)
-            save("configs")
+            save("configs", gid)
 
         if glovar.keywords.get(gid) is None:
             glovar.keywords[gid] = deepcopy(glovar.default_keyword_data)
-            save("keywords")
+            save("keywords", gid)
 
         if glovar.ots.get(gid) is None:
             glovar.ots[gid] = deepcopy(glovar.default_ot_data)
-            save("ots")
+            save("ots", gid)
 
         if glovar.rms.get(gid) is None:
             glovar.rms[gid] = deepcopy(glovar.default_rm_data)
-            save("rms")
+            save("rms", gid)
 
         if glovar.welcomes.get(gid) is None:
             glovar.welcomes[gid] = deepcopy(glovar.default_welcome_data)
-            save("welcomes")
+            save("welcomes", gid)
 
         if glovar.declared_message_ids.get(gid) is None:
             glovar.declared_message_ids[gid] = set()
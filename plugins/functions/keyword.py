@@ -0,0 +1,201 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from typing import Dict, Iterable, List, Pattern, Set
+
+from .. import glovar
+from ..automaton import Automaton
+from .regex import fold_text, get_literals, is_unsafe_word
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The modes that limit a keyword to the messages of these kinds, a message only needs one of them
+KIND_MODES = {"forward", "user", "channel", "reply", "discuss", "mentioned", "service", "leave", "media", "edit", "url",
+              "audio", "document", "photo", "sticker", "animation", "game", "score", "video", "voice", "video_note",
+              "caption", "contact", "location", "venue", "web_page", "poll", "dice", "via_bot", "reply_markup"}
+
+
+class KeywordIndex:
+    # The custom keywords of a group, the include words of all the keywords are found with one scan of the text
+    # The exact words are looked up with the whole text, the regex words are only searched if their literals occur
+
+    __slots__ = ("exact_folded", "exact_sensitive", "folded", "kinds", "limits", "literals", "order", "patterns",
+                 "regexes", "sensitive")
+
+    def __init__(self, kws: Dict[str, dict] = None):
+        kws = kws or {}
+        self.order = {key: i for i, key in enumerate(kws)}
+        self.kinds: Dict[str, Set[str]] = {}
+        self.limits: Dict[str, Set[str]] = {}
+        self.exact_folded: Dict[str, Set[str]] = {}
+        self.exact_sensitive: Dict[str, Set[str]] = {}
+        self.patterns: Dict[str, Dict[str, Pattern]] = {}
+        self.regexes: Set[str] = set()
+        sensitive = []
+        folded = []
+        literals = []
+
+        for key in kws:
+            modes = kws[key]["modes"]
+            case = "case" in modes
+
+            # Dispatch the key by the kind of the text it matches and the kinds of the messages it targets
+            self.kinds.setdefault(get_kind(modes), set()).add(key)
+
+            if modes & KIND_MODES:
+                self.limits[key] = modes & KIND_MODES
+
+            if "regex" in modes:
+                self.patterns[key] = get_patterns(get_words(kws[key]["words"], False), case)
+
+                for word in self.patterns[key]:
+                    words = get_literals(word)
+                    words or self.regexes.add(key)
+                    literals += [(literal, key) for literal in words]
+
+                continue
+
+            words = get_words(kws[key]["words"], "exact" in modes)
+
+            for word in words:
+                if words[word]:
+                    exacts = self.exact_sensitive if case else self.exact_folded
+                    exacts.setdefault(word if case else word.lower(), set()).add(key)
+                elif case:
+                    sensitive.append((word, key))
+                else:
+                    folded.append((word.lower(), key))
+
+        self.sensitive = Automaton(sensitive)
+        self.folded = Automaton(folded)
+        self.literals = Automaton(literals)
+
+    def get_keys(self, kinds: Set[str]) -> Set[str]:
+        # Get the keys targeting the kinds of a message
+        keys = set()
+
+        for kind in kinds:
+            keys |= {key for key in self.kinds.get(kind, set())
+                     if key not in self.limits or self.limits[key] & kinds}
+
+        return keys
+
+    def search(self, keys: Set[str], *texts: str) -> List[str]:
+        # Get the given keys whose words occur in the texts, in the order of the keywords
+        result = self.regexes & keys
+
+        for text in texts:
+            text = text and text.strip()
+
+            if not text:
+                continue
+
+            lower = text.lower()
+            result |= self.exact_sensitive.get(text, set())
+            result |= self.exact_folded.get(lower, set())
+            result |= self.sensitive.search(text)
+            result |= self.folded.search(lower)
+            self.literals and result.update(self.literals.search(fold_text(text)))
+
+        return sorted(result & keys, key=self.order.get)
+
+
+def get_kind(modes: Set[str]) -> str:
+    # Get the kind of the text matched by the keyword
+    if "join" in modes:
+        return "join"
+
+    if "name" in modes:
+        return "name"
+
+    if "filename" in modes:
+        return "filename"
+
+    return "text"
+
+
+def get_keyword_index(gid: int) -> KeywordIndex:
+    # Get the keyword index of a group
+    result = glovar.keyword_indexes.get(gid)
+
+    if result is not None:
+        return result
+
+    return update_keywords(gid)
+
+
+def get_patterns(words: Iterable[str], case: bool) -> Dict[str, Pattern]:
+    # Compile the regex words of a keyword, the unsafe words are never searched
+    result = {}
+
+    try:
+        flags = re.S | re.M if case else re.I | re.S | re.M
+
+        for word in words:
+            if is_unsafe_word(word):
+                logger.warning(f"Skip unsafe keyword regex {word}")
+                continue
+
+            result[word] = re.compile(word, flags)
+    except Exception as e:
+        logger.warning(f"Get patterns error: {e}", exc_info=True)
+
+    return result
+
+
+def get_words(words: set, exact: bool) -> dict:
+    # Get words dict
+    result = {}
+
+    try:
+        for word in words:
+            if word.startswith("{{") and word.endswith("}}"):
+                word = word[2:-2]
+
+                if not word:
+                    continue
+
+                result[word] = True
+            elif exact:
+                result[word] = True
+            else:
+                result[word] = False
+    except Exception as e:
+        logger.warning(f"Get words error: {e}", exc_info=True)
+
+    return result
+
+
+def update_keywords(gid: int) -> KeywordIndex:
+    # Build the keyword index of a group again, replace the old index at once
+    result = KeywordIndex()
+
+    try:
+        if glovar.keywords.get(gid) is None:
+            glovar.keyword_indexes.pop(gid, None)
+            return result
+
+        result = KeywordIndex(glovar.keywords[gid].get("kws", {}))
+        glovar.keyword_indexes[gid] = result
+    except Exception as e:
+        logger.warning(f"Update keywords {gid} error: {e}", exc_info=True)
+
+    return result
@@ -21,6 +21,9 @@ from os import getcwd, getpid, kill
 from signal import SIGABRT
 from subprocess import run
 
+from .file import save_files
+from .regex import save_counts
+
 # Enable logging
 logger = logging.getLogger(__name__)
 
@@ -30,6 +33,8 @@ def restart_program() -> bool:
     result = False
 
     try:
+        save_counts()
+        save_files()
         service_name = getcwd().split("/")[-1]
         run(f"systemctl --user restart {service_name}", shell=True)
         kill(getpid(), SIGABRT)
@@ -44,6 +49,8 @@ def update_program() -> bool:
     result = False
 
     try:
+        save_counts()
+        save_files()
         service_name = getcwd().split("/")[-1]
         run(f"bash ~/scp-079/scripts/update.sh {service_name}", shell=True)
         run(f"git pull", shell=True)
@@ -29,9 +29,10 @@ from .. import glovar
 from .channel import get_debug_text, share_data
 from .config import get_config_text
 from .etc import code, crypt_str, general_link, get_int, get_now, get_text, lang, mention_id, mention_text, thread
-from .file import crypt_file, data_to_file, delete_file, get_new_path, get_downloaded_path, save
+from .file import crypt_file, data_to_file, delete_file, get_new_path, get_downloaded_path, save, save_count
 from .group import get_member, leave_group
 from .ids import init_group_id, init_user_id
+from .regex import compile_words
 from .telegram import send_message, send_report_message
 from .timers import update_admins
 from .tip import tip_welcome
@@ -108,7 +109,7 @@ def receive_help_welcome(client: Client, data: dict) -> bool:
                 continue
 
             glovar.member_ids[group_id].add(user_id)
-            save("member_ids")
+            save("member_ids", group_id)
 
             if not glovar.configs[group_id].get("welcome"):
                 continue
@@ -124,9 +125,7 @@ def receive_help_welcome(client: Client, data: dict) -> bool:
             if not member.user or member.status not in {"member", "restricted"}:
                 continue
 
-            glovar.welcomes[group_id]["count"] += 1
-            glovar.welcomes[group_id]["today"] += 1
-            save("welcomes")
+            save_count("welcomes", (group_id,))
             tip_welcome(client, member.user, group_id, message_id)
 
         result = True
@@ -152,27 +151,25 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
         # Clear bad data
         if (data_type == "bad"
                 and the_type == "users"):
-            glovar.bad_ids["users"] = set()
+            glovar.bad_ids["users"].clear()
             save("bad_ids")
 
         # Clear user data
         elif data_type == "user":
             if the_type == "all":
-                glovar.user_ids = {}
+                glovar.user_ids.clear()
 
             save("user_ids")
 
         # Clear watch data
         elif data_type == "watch":
             if the_type == "all":
-                glovar.watch_ids = {
-                    "ban": {},
-                    "delete": {}
-                }
+                glovar.watch_ids["ban"].clear()
+                glovar.watch_ids["delete"].clear()
             elif the_type == "ban":
-                glovar.watch_ids["ban"] = {}
+                glovar.watch_ids["ban"].clear()
             elif the_type == "delete":
-                glovar.watch_ids["delete"] = {}
+                glovar.watch_ids["delete"].clear()
 
             save("watch_ids")
 
@@ -207,7 +204,7 @@ def receive_config_commit(data: dict) -> bool:
 
         config["lock"] = get_now() - 300
         glovar.configs[gid] = config
-        save("configs")
+        save("configs", gid)
 
         result = True
     except Exception as e:
@@ -471,6 +468,9 @@ def receive_regex(client: Client, message: Message, data: str) -> bool:
 
         save(file_name)
 
+        # Install the compiled rules
+        compile_words(word_type)
+
         # Regenerate special characters dictionary if possible
         if file_name not in {"spc_words", "spe_words"}:
             return False
@@ -634,7 +634,33 @@ def receive_rollback(client: Client, message: Message, data: dict) -> bool:
         if the_data is None:
             return False
 
-        exec(f"glovar.{the_type} = the_data")
+        # Keep the table objects, only replace their content
+        if the_type in glovar.storage_list or the_type in {"user_ids"}:
+            eval(f"glovar.{the_type}").clear()
+            eval(f"glovar.{the_type}").update(the_data)
+        elif the_type == "watch_ids":
+            for key in glovar.watch_ids:
+                glovar.watch_ids[key].clear()
+                glovar.watch_ids[key].update(the_data.get(key, {}))
+        else:
+            exec(f"glovar.{the_type} = the_data")
+
+        # Install the rules again, the rule sets are built without the timeout rules
+        if the_type == "timeout_words":
+            word_types = list(glovar.compiled)
+        elif the_type.endswith("_words"):
+            word_types = [the_type.split("_")[0]]
+        else:
+            word_types = []
+
+        with glovar.locks["regex"]:
+            for word_type in word_types:
+                compile_words(word_type)
+
+        # Build the keyword indexes again
+        if the_type == "keywords":
+            glovar.keyword_indexes = {}
+
         save(the_type)
 
         # Send debug message
@@ -0,0 +1,528 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from bisect import bisect
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+from .. import glovar
+from ..automaton import Automaton
+from .file import save
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The characters matched case-insensitively by the regex engine but not by str.lower()
+CASE_FOLDS = str.maketrans({
+    "\u0131": "i", "\u017f": "s", "\u00b5": "\u03bc", "\u0345": "\u03b9", "\u1fbe": "\u03b9", "\u03c2": "\u03c3",
+    "\u03d0": "\u03b2", "\u03d1": "\u03b8", "\u03d5": "\u03c6", "\u03d6": "\u03c0", "\u03f0": "\u03ba",
+    "\u03f1": "\u03c1", "\u03f5": "\u03b5", "\u1c80": "\u0432", "\u1c81": "\u0434", "\u1c82": "\u043e",
+    "\u1c83": "\u0441", "\u1c84": "\u0442", "\u1c85": "\u0442", "\u1c86": "\u044a", "\u1c87": "\u0463",
+    "\u1c88": "\ua64b", "\u1e9b": "\u1e61"
+})
+
+# The parsed nodes that may contain required literals
+ATOMIC_GROUP = getattr(sre_parse, "ATOMIC_GROUP", None)
+REPEATS = {getattr(sre_parse, op) for op in ["MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"] if hasattr(sre_parse, op)}
+
+# The parsed nodes that may take exponential time
+BACKREFS = {sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS}
+
+# The parsed nodes that match no character
+ZERO_WIDTHS = {sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT}
+
+# The upper bounds of the latency histogram buckets in seconds, the last bucket has no bound
+PROFILE_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1)
+PROFILE_LABELS = ("0.1ms", "1ms", "10ms", "100ms", "1s", "inf")
+
+# The rules using these features can not be put in a union, they are matched one by one
+UNION_UNSAFE = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?<[A-Za-z_]|\(\?\(|\(\?[aiLmsux]+\)")
+
+
+class PreparedText:
+    # The variants of a text matched by the regex rules, each variant is prepared once with its folded text
+
+    __slots__ = ("variants",)
+
+    def __init__(self, text: str = ""):
+        normalized = re.sub(r"\s{2,}", " ", text) if text else ""
+        stripped = re.sub(r"\s", "", normalized) if " " in normalized else ""
+        texts = [t for t in (normalized, stripped) if t]
+
+        # The text without spaces is only matched again if it is different
+        if len(texts) == 2 and texts[0] == texts[1]:
+            texts.pop()
+
+        self.variants: Tuple[Tuple[str, str], ...] = tuple((t, fold_text(t)) for t in texts)
+
+    def __bool__(self) -> bool:
+        return bool(self.variants)
+
+    def __iter__(self):
+        return iter(self.variants)
+
+
+class RuleSet:
+    # The compiled regex rules of a word type, the rules with required literals are only matched if they occur
+    # A rule set is never changed after it is built, the readers use it without the lock and it is replaced as a whole
+
+    __slots__ = ("always", "fallback", "literals", "names", "nocr", "patterns", "union", "union_ocr", "word_type",
+                 "words")
+
+    def __init__(self, word_type: str = "", patterns: Iterable[Tuple[str, Pattern]] = ()):
+        self.word_type = word_type
+        self.patterns = tuple((w, p) for w, p in patterns if w not in glovar.timeout_words)
+        self.words = frozenset(w for w, _ in self.patterns)
+        self.nocr = frozenset(w for w in self.words if "(?# nocr)" in w)
+        self.literals = Automaton((literal, i) for i, (w, _) in enumerate(self.patterns) for literal in get_literals(w))
+        filtered = get_values(self.literals)
+        self.always = tuple(rule for i, rule in enumerate(self.patterns) if i not in filtered)
+        self.fallback = tuple((w, p) for w, p in self.always if not is_union_word(w))
+        self.names = {}
+        self.union = None
+        self.union_ocr = None
+
+        words = [w for w, _ in self.always if is_union_word(w)]
+
+        if not words:
+            return
+
+        try:
+            self.names = {f"r{i}": word for i, word in enumerate(words)}
+            self.union = get_union(self.names)
+            self.union_ocr = get_union({n: w for n, w in self.names.items() if w not in self.nocr})
+        except re.error as e:
+            logger.warning(f"Compile union error: {e}")
+            self.fallback = self.always
+            self.names = {}
+            self.union = None
+            self.union_ocr = None
+
+    def __iter__(self):
+        return iter(self.patterns)
+
+    def get_candidates(self, folded: str) -> List[Tuple[str, Pattern]]:
+        if not self.literals:
+            return []
+
+        return [self.patterns[i] for i in sorted(self.literals.search(folded))]
+
+    def get_union(self, ocr: bool) -> Optional[Pattern]:
+        return self.union_ocr if ocr else self.union
+
+
+def compile_words(word_type: str) -> RuleSet:
+    # Compile the regex rules of a word type, replace the old compiled rules at once
+    result = RuleSet()
+
+    try:
+        compiled = []
+
+        for word in list(eval(f"glovar.{word_type}_words")):
+            try:
+                compiled.append((word, re.compile(word, re.I | re.S | re.M)))
+            except re.error as e:
+                logger.warning(f"Compile {word_type} rule {word} error: {e}")
+
+        result = RuleSet(word_type, compiled)
+        glovar.compiled[word_type] = result
+    except Exception as e:
+        logger.warning(f"Compile words error: {e}", exc_info=True)
+
+    return result
+
+
+def count_word(word_type: str, word: str) -> bool:
+    # Count a hit of the regex rule in memory, the counts are merged into the rules by save_counts()
+    result = False
+
+    try:
+        with glovar.locks["count"]:
+            counter = glovar.regex_counts.get(word_type)
+
+            if counter is None:
+                counter = glovar.regex_counts[word_type] = Counter()
+
+            counter[word] += 1
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Count word error: {e}", exc_info=True)
+
+    return result
+
+
+def get_compiled(word_type: str) -> RuleSet:
+    # Get the compiled regex rules of a word type
+    result = glovar.compiled.get(word_type)
+
+    if result is not None:
+        return result
+
+    with glovar.locks["regex"]:
+        result = glovar.compiled.get(word_type)
+
+        if result is None:
+            result = compile_words(word_type)
+
+    return result
+
+
+def exclude_word(word: str) -> bool:
+    # Replace the rule sets containing the timeout rule, the readers keep using the old rule sets until then
+    result = False
+
+    glovar.locks["regex"].acquire()
+
+    try:
+        for word_type, rules in list(glovar.compiled.items()):
+            if word not in rules.words:
+                continue
+
+            glovar.compiled[word_type] = RuleSet(word_type, rules.patterns)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Exclude word error: {e}", exc_info=True)
+    finally:
+        glovar.locks["regex"].release()
+
+    return result
+
+
+def fold_text(text: str) -> str:
+    # Fold the case of the text, the folded literals of a case-insensitive rule occur in the folded text it matches
+    return text.replace("İ", "i").lower().translate(CASE_FOLDS)
+
+
+def get_first(items: list) -> Tuple[Optional[Set[str]], bool]:
+    # Get the characters a parsed sequence may start with, None is any character, and if it may match nothing
+    result = set()
+
+    for op, av in items:
+        if op in ZERO_WIDTHS:
+            continue
+
+        if op == sre_parse.LITERAL:
+            first, nullable = {chr(av).lower()}, False
+        elif op == sre_parse.IN:
+            first, nullable = get_first_in(av), False
+        elif op == sre_parse.SUBPATTERN:
+            first, nullable = get_first(av[-1])
+        elif op == ATOMIC_GROUP:
+            first, nullable = get_first(av)
+        elif op in REPEATS:
+            first, nullable = get_first(av[2])
+            nullable = nullable or av[0] == 0
+        elif op == sre_parse.BRANCH:
+            firsts = [get_first(branch) for branch in av[1]]
+            first = join_first(f for f, _ in firsts)
+            nullable = any(n for _, n in firsts)
+        else:
+            first, nullable = None, False
+
+        result = join_first([result, first])
+
+        if not nullable:
+            return result, False
+
+    return result, True
+
+
+def get_first_in(items: list) -> Optional[Set[str]]:
+    # Get the characters of a parsed character set, None if the set is negated or too large
+    result = set()
+
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            result.add(chr(av).lower())
+        elif op == sre_parse.RANGE and av[1] - av[0] < 256:
+            result |= {chr(c).lower() for c in range(av[0], av[1] + 1)}
+        else:
+            return None
+
+    return result
+
+
+def get_literals(word: str) -> Set[str]:
+    # Get the literals of a rule, one of them occurs in every text the rule matches
+    result = set()
+
+    try:
+        literals = get_required(sre_parse.parse(word, re.I | re.S | re.M).data)
+
+        if not literals:
+            return set()
+
+        result = {fold_text(literal) for literal in literals}
+    except Exception as e:
+        logger.warning(f"Get literals error: {e}", exc_info=True)
+
+    return result
+
+
+def get_profiles(reset: bool = False) -> List[Dict[str, Any]]:
+    # Get the profiles of the regex rules, the most expensive rule comes first
+    result = []
+
+    try:
+        with glovar.locks["count"]:
+            profiles = glovar.regex_profiles
+
+            if reset:
+                glovar.regex_profiles = {}
+            else:
+                profiles = {key: list(record) for key, record in profiles.items()}
+
+        for (word_type, word), (count, total, most, *histogram) in profiles.items():
+            result.append({
+                "type": word_type,
+                "word": word or "(union)",
+                "count": count,
+                "total": round(total, 6),
+                "mean": round(total / count, 6),
+                "max": round(most, 6),
+                "histogram": dict(zip(PROFILE_LABELS, histogram))
+            })
+
+        result.sort(key=lambda p: p["total"], reverse=True)
+    except Exception as e:
+        logger.warning(f"Get profiles error: {e}", exc_info=True)
+
+    return result
+
+
+def get_required(items: list) -> Optional[Set[str]]:
+    # Get the required literals of a parsed sequence, the most selective choice of the required items is used
+    candidates = []
+    run = []
+
+    for op, av in list(items) + [(None, None)]:
+        if op == sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+
+        if run:
+            candidates.append({"".join(run)})
+            run = []
+
+        if op == sre_parse.SUBPATTERN:
+            required = get_required(av[-1])
+        elif op == ATOMIC_GROUP:
+            required = get_required(av)
+        elif op in REPEATS and av[0] >= 1:
+            required = get_required(av[2])
+        elif op == sre_parse.BRANCH:
+            branches = [get_required(branch) for branch in av[1]]
+            required = None if not all(branches) else set().union(*branches)
+        else:
+            continue
+
+        required and candidates.append(required)
+
+    return max(candidates, key=lambda c: (min(map(len, c)), -len(c)), default=None)
+
+
+def get_slow_words(profiles: List[Dict[str, Any]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    # Get the rules whose mean search time exceeds the threshold, the unions are not rules of REGEX
+    result = {}
+
+    try:
+        for profile in profiles:
+            if profile["word"] == "(union)":
+                continue
+
+            if profile["mean"] * 1000 < glovar.time_slow:
+                continue
+
+            result.setdefault(profile["type"], {})[profile["word"]] = {
+                "count": profile["count"],
+                "mean": profile["mean"],
+                "max": profile["max"]
+            }
+    except Exception as e:
+        logger.warning(f"Get slow words error: {e}", exc_info=True)
+
+    return result
+
+
+def get_union(names: Dict[str, str]) -> Optional[Pattern]:
+    # Combine the rules into one pattern, each rule is a named group
+    if not names:
+        return None
+
+    return re.compile("|".join(f"(?P<{name}>{word})" for name, word in names.items()), re.I | re.S | re.M)
+
+
+def get_values(automaton: Automaton) -> Set[int]:
+    # Get all the values in the automaton
+    return set().union(*automaton.outputs)
+
+
+def is_overlapped(branches: list, follow: Optional[Set[str]]) -> bool:
+    # Check if two alternatives may match the same prefix, an empty alternative starts with what follows the branch
+    firsts = []
+
+    for branch in branches:
+        first, nullable = get_first(branch)
+        firsts.append((join_first([first, follow]) if nullable else first, nullable))
+
+    for i, (first, nullable) in enumerate(firsts):
+        for other, other_nullable in firsts[i + 1:]:
+            if nullable and other_nullable:
+                return True
+
+            if first is None and other is None:
+                return True
+
+            if first is None or other is None:
+                if first or other:
+                    return True
+
+                continue
+
+            if first & other:
+                return True
+
+    return False
+
+
+def is_unsafe_items(items: list, repeated: bool, follow: Optional[Set[str]] = frozenset()) -> bool:
+    # Check if a parsed sequence has a back reference, or a repeat or overlapped alternatives inside an unbounded repeat,
+    # the characters in follow may come after the sequence
+    for i, (op, av) in enumerate(items):
+        if op in BACKREFS:
+            return True
+
+        # Get the characters that may come after the item
+        rest, nullable = get_first(items[i + 1:])
+        after = join_first([rest, follow]) if nullable else rest
+
+        if op in REPEATS:
+            if repeated and av[1] > 1:
+                return True
+
+            # The body of a repeat may be followed by itself
+            if av[1] > 1:
+                after = join_first([get_first(av[2])[0], after])
+
+            if is_unsafe_items(av[2], repeated or av[1] == sre_parse.MAXREPEAT, after):
+                return True
+        elif op == sre_parse.SUBPATTERN and is_unsafe_items(av[-1], repeated, after):
+            return True
+        elif op == ATOMIC_GROUP and is_unsafe_items(av, repeated, after):
+            return True
+        elif op == sre_parse.BRANCH and repeated and is_overlapped(av[1], after):
+            return True
+        elif op == sre_parse.BRANCH and any(is_unsafe_items(branch, repeated, after) for branch in av[1]):
+            return True
+        elif op in {sre_parse.ASSERT, sre_parse.ASSERT_NOT} and is_unsafe_items(av[1], repeated):
+            return True
+
+    return False
+
+
+def is_unsafe_word(word: str) -> bool:
+    # Check if the regex is invalid or may take exponential time
+    result = True
+
+    try:
+        re.compile(word)
+        result = is_unsafe_items(sre_parse.parse(word).data, False)
+    except re.error:
+        return True
+    except Exception as e:
+        logger.warning(f"Is unsafe word error: {e}", exc_info=True)
+
+    return result
+
+
+def is_union_word(word: str) -> bool:
+    # Check if the rule can be put in a union
+    return not UNION_UNSAFE.search(word)
+
+
+def join_first(firsts: Iterable[Optional[Set[str]]]) -> Optional[Set[str]]:
+    # Join the first characters of the parsed sequences, None is any character
+    result = set()
+
+    for first in firsts:
+        if first is None:
+            return None
+
+        result |= first
+
+    return result
+
+
+def profile_word(word_type: str, word: str, secs: float) -> bool:
+    # Record the time of a search with the regex rule, an empty word is the union of the word type
+    result = False
+
+    try:
+        with glovar.locks["count"]:
+            record = glovar.regex_profiles.get((word_type, word))
+
+            if record is None:
+                record = glovar.regex_profiles[(word_type, word)] = [0, 0.0, 0.0] + [0] * len(PROFILE_LABELS)
+
+            record[0] += 1
+            record[1] += secs
+            record[2] = max(record[2], secs)
+            record[3 + bisect(PROFILE_BUCKETS, secs)] += 1
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Profile word error: {e}", exc_info=True)
+
+    return result
+
+
+def save_counts() -> bool:
+    # Merge the counted hits into the regex rules
+    result = False
+
+    try:
+        with glovar.locks["count"]:
+            counts = glovar.regex_counts
+            glovar.regex_counts = {}
+
+        for word_type, counter in counts.items():
+            words = eval(f"glovar.{word_type}_words")
+
+            # The rules may have been replaced by REGEX since the hits were counted
+            for word, count in counter.items():
+                if word not in words:
+                    continue
+
+                words[word] += count
+
+            save(f"{word_type}_words")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Save counts error: {e}", exc_info=True)
+
+    return result
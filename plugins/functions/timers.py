@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
 from subprocess import run
 from time import sleep
@@ -24,11 +25,13 @@ from pyrogram import Client
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from .. import glovar
+from ..containers import IdSet
 from .channel import share_data, share_regex_count
 from .decorators import threaded
 from .etc import bold, code, general_link, get_now, get_readable_time, lang, thread
-from .file import data_to_file, move_file, save
+from .file import data_to_file, move_file, save, save_files
 from .group import delete_message, get_pinned, leave_group, save_admins
+from .regex import get_profiles, get_slow_words, save_counts
 from .telegram import get_admins, get_chat_member, get_group_info, get_members, get_messages, send_message
 from .tip import get_invite_link
 
@@ -42,11 +45,20 @@ def backup_files(client: Client) -> bool:
     result = False
 
     try:
+        # Write the changed data to files first
+        save_files()
+
         for file in glovar.file_list:
             # Check
-            if not eval(f"glovar.{file}"):
+            if file not in glovar.storage_list and not eval(f"glovar.{file}"):
                 continue
 
+            # Export the data in the SQLite backend or in the shards
+            if file in glovar.storage_list or file in glovar.shard_list:
+                path = data_to_file(eval(f"glovar.{file}").copy())
+            else:
+                path = f"{glovar.PICKLE_PATH}/{file}"
+
             # Share
             share_data(
                 client=client,
@@ -54,7 +66,7 @@ def backup_files(client: Client) -> bool:
                 action="backup",
                 action_type="data",
                 data=file,
-                file=f"{glovar.PICKLE_PATH}/{file}"
+                file=path
             )
             sleep(5)
 
@@ -88,6 +100,7 @@ def interval_min_01(client: Client) -> bool:
 
                 if not keyword:
                     glovar.message_ids[gid]["keywords"].pop(key, (0, 0))
+                    save("message_ids", gid)
                     delete_message(client, gid, mid)
                     continue
 
@@ -97,6 +110,7 @@ def interval_min_01(client: Client) -> bool:
                     continue
 
                 glovar.message_ids[gid]["keywords"][key] = (0, 0)
+                save("message_ids", gid)
                 delete_message(client, gid, mid)
 
             # Destruct ot, rm, welcome message
@@ -110,9 +124,15 @@ def interval_min_01(client: Client) -> bool:
                     continue
 
                 glovar.message_ids[gid][the_type] = (0, 0)
+                save("message_ids", gid)
                 delete_message(client, gid, mid)
 
-        save("message_ids")
+        # Merge the regex hits
+        save_counts()
+
+        # Prune expired watches
+        if sum(glovar.watch_ids[the_type].prune(now) for the_type in ["ban", "delete"]):
+            save("watch_ids")
 
         # Generate a new invite link
         for gid in list(glovar.configs):
@@ -141,6 +161,11 @@ def interval_min_10() -> bool:
         for gid in list(glovar.keyworded_ids):
             glovar.keyworded_ids[gid] = {}
 
+        # Fold the journals into the snapshots
+        for journal in list(glovar.journaled_files):
+            file, _, gid = journal.partition(".")
+            save(file, int(gid or 0))
+
         result = True
     except Exception as e:
         logger.warning(f"Interval min 10 error: {e}", exc_info=True)
@@ -170,6 +195,7 @@ def log_rotation() -> bool:
         )
 
         run(f"find {glovar.LOG_PATH}/log-* -mtime +30 -delete", shell=True)
+        run(f"find {glovar.LOG_PATH}/profile-* -mtime +30 -delete", shell=True)
 
         result = True
     except Exception as e:
@@ -247,22 +273,18 @@ def reset_data(client: Client) -> bool:
     glovar.locks["message"].acquire()
 
     try:
-        glovar.bad_ids = {
-            "channels": set(),
-            "users": set()
-        }
+        glovar.bad_ids["channels"].clear()
+        glovar.bad_ids["users"].clear()
         save("bad_ids")
 
         glovar.left_group_ids = set()
         save("left_group_ids")
 
-        glovar.user_ids = {}
+        glovar.user_ids.clear()
         save("user_ids")
 
-        glovar.watch_ids = {
-            "ban": {},
-            "delete": {}
-        }
+        glovar.watch_ids["ban"].clear()
+        glovar.watch_ids["delete"].clear()
         save("watch_ids")
 
         # Send debug message
@@ -286,6 +308,8 @@ def send_count(client: Client) -> bool:
     glovar.locks["regex"].acquire()
 
     try:
+        save_counts()
+
         for word_type in glovar.regex:
             share_regex_count(client, word_type)
             word_list = list(eval(f"glovar.{word_type}_words"))
@@ -304,6 +328,40 @@ def send_count(client: Client) -> bool:
     return result
 
 
+def share_regex_slow(client: Client) -> bool:
+    # Use this function to share the slow regex rules to REGEX, then start a new profile period
+    result = False
+
+    try:
+        if not glovar.profile:
+            return False
+
+        profiles = get_profiles(True)
+
+        # Keep the full profile of the period in the log directory
+        if profiles:
+            with open(f"{glovar.LOG_PATH}/profile-{get_readable_time(the_format='%Y%m%d')}.json", "w") as f:
+                json.dump({"profiles": profiles}, f, indent=4)
+
+        slow_words = get_slow_words(profiles)
+
+        if not slow_words:
+            return False
+
+        file = data_to_file(slow_words)
+        result = share_data(
+            client=client,
+            receivers=["REGEX"],
+            action="regex",
+            action_type="slow",
+            file=file
+        )
+    except Exception as e:
+        logger.warning(f"Share regex slow error: {e}", exc_info=True)
+
+    return result
+
+
 def share_regex_timeout(client: Client) -> bool:
     # Use this function to share regex remove request to REGEX
     result = False
@@ -461,7 +519,7 @@ def update_members(client: Client) -> bool:
                     continue
 
                 # Get member ids
-                member_ids = {member.user.id for member in members}
+                member_ids = IdSet(member.user.id for member in members)
 
                 # Check member ids
                 if not member_ids:
@@ -471,7 +529,7 @@ def update_members(client: Client) -> bool:
                 with glovar.locks["message"]:
                     glovar.member_ids[gid] = member_ids
 
-                save("member_ids")
+                save("member_ids", gid)
             except Exception as e:
                 logger.warning(f"Update members in {gid} error: {e}", exc_info=True)
 
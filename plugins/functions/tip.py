@@ -69,7 +69,7 @@ def get_invite_link(client: Client, the_type: str, gid: int, manual: bool = Fals
             glovar.channels[gid]["cid"] = 0
             glovar.channels[gid]["mid"] = 0
             glovar.channels[gid]["time"] = 0
-            save("channels")
+            save("channels", gid)
             delete_message(client, cid, mid)
             return False
         elif not link:
@@ -77,7 +77,7 @@ def get_invite_link(client: Client, the_type: str, gid: int, manual: bool = Fals
 
         # Update the link
         glovar.channels[gid]["link"] = link
-        save("channels")
+        save("channels", gid)
 
         # Check the config
         if not enabled and the_type != "open":
@@ -86,10 +86,10 @@ def get_invite_link(client: Client, the_type: str, gid: int, manual: bool = Fals
         # Change the config
         if the_type == "close":
             glovar.configs[gid]["channel"] = False
-            save("configs")
+            save("configs", gid)
         elif the_type == "open":
             glovar.configs[gid]["channel"] = True
-            save("configs")
+            save("configs", gid)
 
         # Generate markup
         markup = InlineKeyboardMarkup(
@@ -118,7 +118,7 @@ def get_invite_link(client: Client, the_type: str, gid: int, manual: bool = Fals
             if result:
                 glovar.channels[gid]["mid"] = mid
                 glovar.channels[gid]["time"] = now
-                save("channels")
+                save("channels", gid)
                 return True
             elif result is False:
                 return False
@@ -131,7 +131,7 @@ def get_invite_link(client: Client, the_type: str, gid: int, manual: bool = Fals
 
         glovar.channels[gid]["mid"] = result.message_id
         glovar.channels[gid]["time"] = now
-        save("channels")
+        save("channels", gid)
         mid and delete_message(client, cid, mid)
 
         result = True
@@ -191,7 +191,7 @@ def tip_keyword(client: Client, message: Message, data: dict) -> bool:
         mid, _ = glovar.message_ids[gid]["keywords"].get(key, (0, 0))
         mid and delete_message(client, gid, mid)
         glovar.message_ids[gid]["keywords"][key] = (result.message_id, now)
-        save("message_ids")
+        save("message_ids", gid)
         
         result = True
     except Exception as e:
@@ -232,7 +232,7 @@ def tip_saved(client: Client, gid: int, user: User, key: str) -> bool:
         mid, _ = glovar.message_ids[gid]["keywords"].get(key, (0, 0))
         mid and delete_message(client, gid, mid)
         glovar.message_ids[gid]["keywords"][key] = (result.message_id, now)
-        save("message_ids")
+        save("message_ids", gid)
 
         result = True
     except Exception as e:
@@ -271,7 +271,7 @@ def tip_ot(client: Client, gid: int, mid: int = None) -> bool:
         mid, _ = glovar.message_ids[gid]["ot"]
         mid and delete_message(client, gid, mid)
         glovar.message_ids[gid]["ot"] = (result.message_id, now)
-        save("message_ids")
+        save("message_ids", gid)
         
         result = True
     except Exception as e:
@@ -310,7 +310,7 @@ def tip_rm(client: Client, gid: int, mid: int = None) -> bool:
         mid, _ = glovar.message_ids[gid]["rm"]
         mid and delete_message(client, gid, mid)
         glovar.message_ids[gid]["rm"] = (result.message_id, now)
-        save("message_ids")
+        save("message_ids", gid)
         
         result = True
     except Exception as e:
@@ -363,7 +363,7 @@ def tip_welcome(client: Client, user: User, gid: int = 0, mid: int = None, force
         mid, _ = glovar.message_ids[gid]["welcome"]
         mid and delete_message(client, gid, mid)
         glovar.message_ids[gid]["welcome"] = (result.message_id, now)
-        save("message_ids")
+        save("message_ids", gid)
 
         result = True
     except Exception as e:
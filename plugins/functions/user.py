@@ -241,7 +241,7 @@ def terminate_user(client: Client, message: Message, data: dict) -> bool:
         mid, _ = glovar.message_ids[gid]["keywords"].get(key, (0, 0))
         mid and delete_message(client, gid, mid)
         glovar.message_ids[gid]["keywords"][key] = (result.message_id, now)
-        save("message_ids")
+        save("message_ids", gid)
 
         result = True
     except Exception as e:
@@ -22,14 +22,19 @@ from codecs import getdecoder
 from configparser import RawConfigParser
 from os.path import exists
 from string import ascii_lowercase
-from threading import Lock
-from typing import Dict, List, Set, Tuple, Union
+from threading import Lock, RLock
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from pyrogram import emoji
 from pyrogram.types import Chat, ChatMember
 from yaml import safe_load
 
 from .checker import check_all, raise_error
+from .containers import IdSet, ScoreTable, WatchList
+from .matcher import MatcherPool
+from .storage import (SQLiteStorage, get_journals, get_table, load_shards, load_snapshot, replay_journal,
+                      write_snapshot)
 from .version import version_control
 
 # Path variables
@@ -37,10 +42,14 @@ CONFIG_PATH = "data/config/config.ini"
 CUSTOM_LANG_PATH = "data/config/custom.yml"
 LOG_PATH = "data/log"
 PICKLE_BACKUP_PATH = "data/pickle/backup"
+PICKLE_JOURNAL_PATH = "data/pickle/journal"
 PICKLE_PATH = "data/pickle"
+PICKLE_SHARD_BACKUP_PATH = "data/pickle/backup/shard"
+PICKLE_SHARD_PATH = "data/pickle/shard"
 JOIN_PATH = "data/config/join.txt"
 SESSION_DIR_PATH = "data/session"
 SESSION_PATH = "data/session/bot.session"
+SQLITE_PATH = "data/sqlite/storage.db"
 START_PATH = "data/config/start.txt"
 TMP_PATH = "data/tmp"
 
@@ -117,13 +126,19 @@ normalize: Union[bool, str] = "True"
 # [mode]
 aio: Union[bool, str] = "False"
 backup: Union[bool, str] = "False"
+matcher: str = "local"
+profile: Union[bool, str] = "False"
+storage: str = "pickle"
 
 # [time]
 date_reset: str = "1st mon"
 time_channel: int = 0
 time_keyword: int = 0
 time_ot: int = 0
+time_regex: int = 5
 time_rm: int = 0
+time_save: int = 10
+time_slow: int = 50
 time_welcome: int = 0
 
 try:
@@ -192,13 +207,20 @@ try:
     aio = eval(aio)
     backup = config.get("mode", "backup", fallback=backup)
     backup = eval(backup)
+    matcher = config.get("mode", "matcher", fallback=matcher)
+    profile = config.get("mode", "profile", fallback=profile)
+    profile = eval(profile)
+    storage = config.get("mode", "storage", fallback=storage)
 
     # [time]
     date_reset = config.get("time", "date_reset", fallback=date_reset)
     time_channel = int(config.get("time", "time_channel", fallback=time_channel))
     time_keyword = int(config.get("time", "time_keyword", fallback=time_keyword))
     time_ot = int(config.get("time", "time_ot", fallback=time_ot))
+    time_regex = int(config.get("time", "time_regex", fallback=time_regex))
     time_rm = int(config.get("time", "time_rm", fallback=time_rm))
+    time_save = int(config.get("time", "time_save", fallback=time_save))
+    time_slow = int(config.get("time", "time_slow", fallback=time_slow))
     time_welcome = int(config.get("time", "time_welcome", fallback=time_welcome))
 
     # [flag]
@@ -264,14 +286,20 @@ check_all(
         },
         "mode": {
             "aio": aio,
-            "backup": backup
+            "backup": backup,
+            "matcher": matcher,
+            "profile": profile,
+            "storage": storage
         },
         "time": {
             "date_reset": date_reset,
             "time_channel": time_channel,
             "time_keyword": time_keyword,
             "time_ot": time_ot,
+            "time_regex": time_regex,
             "time_rm": time_rm,
+            "time_save": time_save,
+            "time_slow": time_slow,
             "time_welcome": time_welcome
         }
     },
@@ -302,6 +330,7 @@ all_commands: List[str] = [
     "keywords",
     "kws",
     "ot",
+    "profile",
     "resend",
     "restart",
     "rm",
@@ -401,6 +430,11 @@ default_welcome_data: Dict[str, Union[int, str]] = {
     "today": 0
 }
 
+compiled: Dict[str, Any] = {}
+# compiled = {
+#     "ad": RuleSet
+# }
+
 emoji_set: Set[str] = {v for k, v in vars(emoji).items() if not k.startswith("_")}
 
 hold_ids: Dict[int, str] = {}
@@ -408,6 +442,14 @@ hold_ids: Dict[int, str] = {}
 #     -10012345678: "random"
 # }
 
+journaled_files: Set[str] = set()
+# journaled_files = {"keywords.-10012345678", "ad_words"}
+
+keyword_indexes: Dict[int, Any] = {}
+# keyword_indexes = {
+#     -10012345678: KeywordIndex
+# }
+
 keyworded_ids: Dict[int, Dict[int, Set[str]]] = {}
 # keyworded_ids = {
 #     -10012345678: {
@@ -419,9 +461,14 @@ locks: Dict[str, Lock] = {
     "admin": Lock(),
     "channel": Lock(),
     "config": Lock(),
+    "count": Lock(),
+    "file": Lock(),
+    "journal": Lock(),
+    "load": RLock(),
     "message": Lock(),
     "receive": Lock(),
-    "regex": Lock()
+    "regex": Lock(),
+    "save": Lock()
 }
 
 members: Dict[int, Dict[int, ChatMember]] = {}
@@ -458,6 +505,24 @@ regex: Dict[str, bool] = {
 for c in ascii_lowercase:
     regex[f"ad{c}"] = False
 
+regex_counts: Dict[str, Dict[str, int]] = {}
+# regex_counts = {
+#     "ad": Counter({"regex": 1})
+# }
+
+regex_profiles: Dict[Tuple[str, str], List[Union[float, int]]] = {}
+# regex_profiles = {
+#     ("ad", "regex"): [count, total, max, 0, 0, 0, 0, 0, 0]
+# }
+
+saved_files: Set[str] = set()
+# saved_files = {"keywords"}
+
+saved_shards: Dict[str, Set[int]] = {}
+# saved_shards = {
+#     "keywords": {-10012345678}
+# }
+
 sender: str = "TIP"
 
 should_hide: bool = False
@@ -467,7 +532,7 @@ started_ids: Set[int] = set()
 
 updating: bool = False
 
-version: str = "0.2.8"
+version: str = "0.2.9"
 
 welcomed_ids: Dict[int, Set[int]] = {}
 # welcomed_ids = {
@@ -531,7 +596,7 @@ lack_group_ids: Set[int] = set()
 left_group_ids: Set[int] = set()
 # left_group_ids = {-10012345678}
 
-member_ids: Dict[int, Set[int]] = {}
+member_ids: Dict[int, IdSet] = {}
 # member_ids = {
 #     -10012345678: {12345678}
 # }
@@ -558,7 +623,7 @@ trust_ids: Dict[int, Set[int]] = {}
 #     -10012345678: {12345678}
 # }
 
-user_ids: Dict[int, Dict[str, Dict[str, float]]] = {}
+user_ids: ScoreTable = ScoreTable(default_user_status["score"])
 # user_ids = {
 #     12345678: {
 #         "score": {
@@ -574,9 +639,9 @@ user_ids: Dict[int, Dict[str, Dict[str, float]]] = {}
 #     }
 # }
 
-watch_ids: Dict[str, Dict[int, int]] = {
-    "ban": {},
-    "delete": {}
+watch_ids: Dict[str, WatchList] = {
+    "ban": WatchList(),
+    "delete": WatchList()
 }
 # watch_ids = {
 #     "ban": {
@@ -718,29 +783,104 @@ file_list: List[str] = ["admin_ids", "bad_ids", "flooded_ids", "group_ids", "ign
                         "token", "welcomes"]
 file_list += [f"{f}_words" for f in regex]
 
-for file in file_list:
-    try:
+# Save the per-group data in one file per group
+shard_list: List[str] = ["channels", "configs", "keywords", "member_ids", "message_ids", "ots", "rms", "welcomes"]
+
+# Run the regex searches in the matcher processes with a hard deadline
+matcher_pool: Optional[MatcherPool] = MatcherPool() if matcher == "process" else None
+
+# Use the SQLite backend for the per-user and per-member data
+storage_list: List[str] = []
+sqlite_storage: Optional[SQLiteStorage] = None
+
+if storage == "sqlite":
+    storage_list = ["bad_ids", "member_ids", "user_ids", "watch_ids"]
+    sqlite_storage = SQLiteStorage(SQLITE_PATH, default_user_status["score"])
+    shard_list = [file for file in shard_list if file not in storage_list]
+
+# Keep the default values, the data is loaded from the storage backend on first access
+default_data: Dict[str, Any] = {file: globals().pop(file) for file in file_list}
+
+load_times: Dict[str, float] = {}
+# load_times = {
+#     "configs": 0.01
+# }
+
+
+def load_data(file: str) -> Any:
+    # Load a global variable from the storage backend
+    start = perf_counter()
+    data = default_data[file]
+
+    # Import the old pickle data into the SQLite backend once
+    if file in storage_list:
         try:
-            if exists(f"{PICKLE_PATH}/{file}") or exists(f"{PICKLE_BACKUP_PATH}/{file}"):
+            table = get_table(sqlite_storage, file, data)
+
+            if not sqlite_storage.is_imported(file) and exists(f"{PICKLE_PATH}/{file}"):
                 with open(f"{PICKLE_PATH}/{file}", "rb") as f:
-                    locals()[f"{file}"] = pickle.load(f)
+                    table.update(pickle.load(f))
+            elif not sqlite_storage.is_imported(file) and exists(f"{PICKLE_SHARD_PATH}/{file}"):
+                table.update(load_shards(f"{PICKLE_SHARD_PATH}/{file}", f"{PICKLE_SHARD_BACKUP_PATH}/{file}"))
+
+            sqlite_storage.set_imported(file)
+            data = table
+        except Exception as e:
+            logger.critical(f"Load data {file} from SQLite error: {e}", exc_info=True)
+            raise SystemExit("[DATA CORRUPTION]")
+
+    # Load the per-group data from it's shards
+    elif file in shard_list:
+        try:
+            data = load_shards(f"{PICKLE_SHARD_PATH}/{file}", f"{PICKLE_SHARD_BACKUP_PATH}/{file}")
+        except Exception as e:
+            logger.critical(f"Load data {file} shards error: {e}", exc_info=True)
+            raise SystemExit("[DATA CORRUPTION]")
+    else:
+        try:
+            if exists(f"{PICKLE_PATH}/{file}") or exists(f"{PICKLE_BACKUP_PATH}/{file}"):
+                data = load_snapshot(f"{PICKLE_PATH}/{file}", f"{PICKLE_BACKUP_PATH}/{file}")
             else:
-                with open(f"{PICKLE_PATH}/{file}", "wb") as f:
-                    pickle.dump(eval(f"{file}"), f)
+                write_snapshot(f"{PICKLE_PATH}/{file}", f"{PICKLE_BACKUP_PATH}/{file}", data)
         except Exception as e:
-            logger.error(f"Load data {file} error: {e}", exc_info=True)
+            logger.critical(f"Load data {file} error: {e}", exc_info=True)
+            raise SystemExit("[DATA CORRUPTION]")
+
+    # Use the compact id set for the members of the groups
+    if file == "member_ids" and file not in storage_list:
+        for gid in list(data):
+            if not isinstance(data[gid], IdSet):
+                data[gid] = IdSet(data[gid])
+
+    # Use the score table for the users' scores
+    if file == "user_ids" and file not in storage_list and not isinstance(data, ScoreTable):
+        table = ScoreTable(default_user_status["score"])
+        table.update(data)
+        data = table
+
+    # Index the watches by the expiry time
+    if file == "watch_ids" and file not in storage_list:
+        for key in list(data):
+            if not isinstance(data[key], WatchList):
+                data[key] = WatchList(data[key])
+
+    # Replay the counter changes that have not been saved to the snapshot yet
+    if file not in storage_list:
+        for journal in get_journals(PICKLE_JOURNAL_PATH, file):
+            replay_journal(f"{PICKLE_JOURNAL_PATH}/{journal}", data)
+            journaled_files.add(journal)
+
+    globals()[file] = data
+    load_times[file] = perf_counter() - start
 
-            with open(f"{PICKLE_BACKUP_PATH}/{file}", "rb") as f:
-                locals()[f"{file}"] = pickle.load(f)
-    except Exception as e:
-        logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
-        raise SystemExit("[DATA CORRUPTION]")
+    return data
 
-# Generate special characters dictionary
-for special in ["spc", "spe"]:
-    locals()[f"{special}_dict"]: Dict[str, str] = {}
 
-    for rule in locals()[f"{special}_words"]:
+def load_special(special: str) -> Dict[str, str]:
+    # Generate special characters dictionary
+    result = {}
+
+    for rule in get_data(f"{special}_words"):
         # Check keys
         if "[" not in rule:
             continue
@@ -753,7 +893,32 @@ for special in ["spc", "spe"]:
         value = rule.split("?#")[1][1]
 
         for k in keys:
-            locals()[f"{special}_dict"][k] = value
+            result[k] = value
+
+    globals()[f"{special}_dict"] = result
+
+    return result
+
+
+def get_data(name: str) -> Any:
+    # Get a global variable, load it if it has not been loaded yet
+    with locks["load"]:
+        if name in globals():
+            return globals()[name]
+
+        if name in default_data:
+            return load_data(name)
+
+        return load_special(name[:3])
+
+
+def __getattr__(name: str) -> Any:
+    # Load the persisted global variables on first access
+    if name in default_data or name in {"spc_dict", "spe_dict"}:
+        return get_data(name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Start program
 copyright_text = (f"SCP-079-{sender} v{version}, Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>\n"
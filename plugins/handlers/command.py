@@ -32,13 +32,14 @@ from ..functions.config import (conflict_config, get_config_text, kws_add, kws_c
                                 kws_config_gid, kws_remove, kws_show, start_kws, update_config)
 from ..functions.etc import (code, code_block, general_link, get_int, get_now, get_readable_time, lang,
                              mention_id, random_str, thread)
-from ..functions.file import save
+from ..functions.file import delete_file, file_json, save
 from ..functions.filters import (authorized_group, class_e, from_user, is_class_c, is_class_e_user, is_from_user,
                                  test_group)
 from ..functions.group import pin_hold
 from ..functions.markup import get_text_and_markup, get_text_and_markup_tip
 from ..functions.program import restart_program, update_program
-from ..functions.telegram import (forward_messages, get_chat, get_group_info, get_start, send_message,
+from ..functions.regex import get_profiles, get_slow_words
+from ..functions.telegram import (forward_messages, get_chat, get_group_info, get_start, send_document, send_message,
                                   send_report_message)
 from ..functions.tip import get_invite_link, tip_ot, tip_rm, tip_welcome
 from ..functions.user import add_start, get_user_from_message
@@ -127,11 +128,11 @@ def channel_bind(client: Client, message: Message) -> bool:
 
         glovar.channels[gid]["aid"] = aid
         glovar.channels[gid]["cid"] = cid
-        save("channels")
+        save("channels", gid)
 
         glovar.configs[gid]["default"] = False
         glovar.configs[gid]["channel"] = True
-        save("configs")
+        save("configs", gid)
 
         result = get_invite_link(
             client=client,
@@ -202,7 +203,7 @@ def channel_config(client: Client, message: Message) -> bool:
         # Change the button config
         glovar.channels[gid]["aid"] = aid
         glovar.channels[gid][command_type] = command_context
-        save("channels")
+        save("channels", gid)
         get_invite_link(
             client=client,
             the_type="edit",
@@ -405,7 +406,7 @@ def config(client: Client, message: Message) -> bool:
 
         # Set lock
         glovar.configs[gid]["lock"] = now
-        save("configs")
+        save("configs", gid)
 
         # Ask CONFIG generate a config session
         group_name, group_link = get_group_info(client, message.chat)
@@ -586,21 +587,21 @@ def config_tip(client: Client, message: Message) -> bool:
             glovar.ots[gid]["aid"] = aid
             glovar.ots[gid]["old"] = old_reply
             glovar.ots[gid]["reply"] = command_type
-            save("ots")
+            save("ots", gid)
         elif command == "rm":
             last_editor = glovar.rms[gid]["aid"]
             old_reply = glovar.rms[gid].get("reply", "")
             glovar.rms[gid]["aid"] = aid
             glovar.rms[gid]["old"] = old_reply
             glovar.rms[gid]["reply"] = command_type
-            save("rms")
+            save("rms", gid)
         elif command == "welcome":
             last_editor = glovar.welcomes[gid]["aid"]
             old_reply = glovar.welcomes[gid].get("reply", "")
             glovar.welcomes[gid]["aid"] = aid
             glovar.welcomes[gid]["old"] = old_reply
             glovar.welcomes[gid]["reply"] = command_type
-            save("welcomes")
+            save("welcomes", gid)
         else:
             return False
 
@@ -751,7 +752,7 @@ def hold(client: Client, message: Message) -> bool:
         glovar.pinned_ids[gid] = r_message.message_id
         save("pinned_ids")
         glovar.configs[gid]["hold"] = True
-        save("configs")
+        save("configs", gid)
 
         # Get hold id
         hid = random_str(8)
@@ -840,7 +841,7 @@ def kws(client: Client, message: Message) -> bool:
         glovar.keywords[gid]["lock"] = now
         glovar.keywords[gid]["aid"] = aid
         kws_config_occupy(gid, aid)
-        save("keywords")
+        save("keywords", gid)
 
         # Add start status
         key = add_start(get_now() + 180, gid, aid, "kws")
@@ -878,6 +879,62 @@ def kws(client: Client, message: Message) -> bool:
     return result
 
 
+@Client.on_message(filters.incoming & filters.group & filters.command(["profile"], glovar.prefix)
+                   & test_group
+                   & from_user)
+def profile(client: Client, message: Message) -> bool:
+    # Dump the profiles of the regex rules
+    result = False
+
+    try:
+        # Basic data
+        cid = message.chat.id
+        aid = message.from_user.id
+        mid = message.message_id
+
+        # Get command type
+        command_type = get_command_type(message)
+
+        # Check the command type
+        if command_type and command_type.upper() != glovar.sender:
+            return False
+
+        # Generate the text
+        text = (f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n\n"
+                f"{lang('project')}{lang('colon')}{code(glovar.sender)}\n"
+                f"{lang('action')}{lang('colon')}{code(lang('program_profile'))}\n")
+
+        # Check the profile config
+        if not glovar.profile:
+            text += f"{lang('status')}{lang('colon')}{code(lang('disabled'))}\n"
+            return thread(send_message, (client, cid, text, mid))
+
+        profiles = get_profiles()
+        slow_words = get_slow_words(profiles)
+        text += (f"{lang('profile_rules')}{lang('colon')}{code(len(profiles))}\n"
+                 f"{lang('profile_slow')}{lang('colon')}{code(sum(len(slow_words[t]) for t in slow_words))}\n")
+
+        # Send the report message
+        if not profiles:
+            return thread(send_message, (client, cid, text, mid))
+
+        file = file_json({"profiles": profiles})
+
+        if not file:
+            return False
+
+        send_document(client, cid, file, None, text, mid)
+
+        # Delete the file
+        thread(delete_file, (file,))
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Profile error: {e}", exc_info=True)
+
+    return result
+
+
 @Client.on_message(filters.incoming & filters.private & filters.command(["remove", "rm"], glovar.prefix)
                    & from_user & class_e)
 def remove(client: Client, message: Message) -> bool:
@@ -23,8 +23,9 @@ from pyrogram.types import Message
 
 from .. import glovar
 from ..functions.channel import get_debug_text
+from ..functions.context import DetectionContext
 from ..functions.etc import code, delay, general_link, get_now, lang, mention_id, random_str, thread
-from ..functions.file import save
+from ..functions.file import save, save_count
 from ..functions.filters import (aio, authorized_group, declared_message, exchange_channel, from_user, hide_channel,
                                  is_declared_message, is_high_score_user, is_keyword_message, is_nospam_message,
                                  is_nospam_join, is_rm_text, is_user_class_d, is_watch_user, new_group, test_group)
@@ -58,6 +59,7 @@ def check(client: Client, message: Message) -> bool:
         # Basic data
         gid = message.chat.id
         mid = message.message_id
+        context = DetectionContext()
 
         # Check the config
         if ((not glovar.configs[gid].get("keyword") and not glovar.configs[gid].get("rm"))
@@ -69,7 +71,7 @@ def check(client: Client, message: Message) -> bool:
             return False
 
         # Check NOSPAM status
-        if is_nospam_message(message):
+        if is_nospam_message(message, context):
             return False
 
         # Check declare status
@@ -77,22 +79,18 @@ def check(client: Client, message: Message) -> bool:
             return True
 
         # Check keyword
-        detection = is_keyword_message(message)
+        detection = is_keyword_message(message, context)
 
         if detection:
             key = detection["key"]
-            glovar.keywords[gid]["kws"][key]["count"] += 1
-            glovar.keywords[gid]["kws"][key]["today"] += 1
-            save("keywords")
+            save_count("keywords", (gid, "kws", key))
             return tip_keyword(client, message, detection)
 
         # Check rm
-        detection = is_rm_text(message)
+        detection = is_rm_text(message, context)
 
         if detection:
-            glovar.rms[gid]["count"] += 1
-            glovar.rms[gid]["today"] += 1
-            save("rms")
+            save_count("rms", (gid,))
             return tip_rm(client, gid, mid)
 
         result = True
@@ -120,13 +118,14 @@ def check_join(client: Client, message: Message) -> bool:
         user = message.new_chat_members[0]
         mid = message.message_id
         now = message.date or get_now()
+        context = DetectionContext()
 
         # Check class D status
         if is_user_class_d(gid, user):
             return False
 
         # Check NOSPAM status
-        if is_nospam_join(client, gid, user):
+        if is_nospam_join(client, gid, user, context):
             return False
 
         # Check declare status
@@ -134,11 +133,11 @@ def check_join(client: Client, message: Message) -> bool:
             return False
 
         # Check keyword name
-        detection = is_keyword_message(message)
+        detection = is_keyword_message(message, context)
 
         if detection:
             glovar.member_ids[gid].add(user.id)
-            save("member_ids")
+            save("member_ids", gid)
             return tip_keyword(client, message, detection)
 
         # Check config
@@ -155,7 +154,7 @@ def check_join(client: Client, message: Message) -> bool:
 
         # Add to joined members
         glovar.member_ids[gid].add(user.id)
-        save("member_ids")
+        save("member_ids", gid)
 
         # User status
         if is_watch_user(user, "ban", now):
@@ -172,9 +171,7 @@ def check_join(client: Client, message: Message) -> bool:
             return False
 
         # Welcome
-        glovar.welcomes[gid]["count"] += 1
-        glovar.welcomes[gid]["today"] += 1
-        save("welcomes")
+        save_count("welcomes", (gid,))
         tip_welcome(client, user, gid, mid)
 
         result = True
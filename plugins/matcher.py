@@ -0,0 +1,156 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+import sys
+from multiprocessing.connection import Connection
+from os import close, pipe
+from queue import Queue
+from subprocess import Popen
+from typing import Dict, Optional, Pattern, Tuple
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class MatchResult:
+    # The result of a search in the matcher process, works like a match object for the filters
+
+    __slots__ = ("lastgroup", "regs", "string")
+
+    def __init__(self, lastgroup: Optional[str], regs: Tuple[int, int], string: str):
+        self.lastgroup = lastgroup
+        self.regs = regs
+        self.string = string
+
+    def __repr__(self) -> str:
+        return f"<MatchResult span={self.regs}, match={self.string!r}>"
+
+    def group(self) -> str:
+        return self.string
+
+    def span(self) -> Tuple[int, int]:
+        return self.regs
+
+
+class Matcher:
+    # A matcher process, the main process kills it when a search misses the deadline
+
+    def __init__(self):
+        self.ids: Dict[Tuple[str, int], int] = {}
+        self.process: Optional[Popen] = None
+        self.receiver: Optional[Connection] = None
+        self.sender: Optional[Connection] = None
+
+    def search(self, pattern: Pattern, text: str, timeout: float) -> Optional[MatchResult]:
+        if self.process is None or self.process.poll() is not None or len(self.ids) > 4096:
+            self.start()
+
+        # Only send the pattern the first time, the matcher process keeps it compiled
+        key = (pattern.pattern, pattern.flags)
+        index = self.ids.get(key)
+
+        if index is None:
+            index = len(self.ids)
+            self.ids[key] = index
+            self.sender.send((index, pattern.pattern, pattern.flags, text))
+        else:
+            self.sender.send((index, None, 0, text))
+
+        if not self.receiver.poll(timeout):
+            self.stop()
+            raise TimeoutError(pattern.pattern)
+
+        result = self.receiver.recv()
+
+        if result is None:
+            return None
+
+        return MatchResult(*result)
+
+    def start(self) -> None:
+        self.stop()
+
+        request_in, request_out = pipe()
+        reply_in, reply_out = pipe()
+        self.process = Popen([sys.executable, "-m", "plugins.matcher", str(request_in), str(reply_out)],
+                             pass_fds=(request_in, reply_out))
+        close(request_in)
+        close(reply_out)
+        self.sender = Connection(request_out, readable=False)
+        self.receiver = Connection(reply_in, writable=False)
+
+    def stop(self) -> None:
+        self.ids = {}
+
+        for connection in [self.sender, self.receiver]:
+            connection and connection.close()
+
+        self.sender = None
+        self.receiver = None
+
+        if self.process is None:
+            return
+
+        self.process.poll() is None and self.process.kill()
+        self.process.wait()
+        self.process = None
+
+
+class MatcherPool:
+    # A pool of matcher processes shared by the handler threads
+
+    def __init__(self, size: int = 4):
+        self.idle = Queue()
+
+        for _ in range(size):
+            self.idle.put(Matcher())
+
+    def search(self, pattern: Pattern, text: str, timeout: float) -> Optional[MatchResult]:
+        matcher = self.idle.get()
+
+        try:
+            return matcher.search(pattern, text, timeout)
+        finally:
+            self.idle.put(matcher)
+
+
+def run_matcher(receiver: Connection, sender: Connection) -> None:
+    # Search the texts sent by the main process
+    patterns = {}
+
+    while True:
+        try:
+            index, pattern, flags, text = receiver.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        try:
+            if pattern is not None:
+                patterns[index] = re.compile(pattern, flags)
+
+            match = patterns[index].search(text)
+            sender.send(match and (match.lastgroup, match.span(), match.group()))
+        except Exception as e:
+            logger.warning(f"Run matcher error: {e}", exc_info=True)
+            sender.send(None)
+
+
+if __name__ == "__main__":
+    run_matcher(Connection(int(sys.argv[1]), writable=False), Connection(int(sys.argv[2]), readable=False))
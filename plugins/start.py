@@ -17,9 +17,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from os import getpid, kill
+from signal import SIGABRT
 
 from . import glovar
+from .functions.decorators import threaded
 from .functions.file import delete_file, save
+from .functions.regex import get_compiled
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -43,6 +47,36 @@ def init() -> bool:
     return result
 
 
+@threaded()
+def preload() -> bool:
+    # Load the data that has not been accessed yet, then report the time spent on each file
+    result = False
+
+    try:
+        # Stop the program if any data file is corrupted, the bot must not run with the default data
+        for file in glovar.file_list:
+            try:
+                glovar.get_data(file)
+            except BaseException as e:
+                logger.critical(f"Preload {file} error: {e}", exc_info=True)
+                kill(getpid(), SIGABRT)
+
+        # Build the literal index of the regex rules before the first message
+        for word_type in glovar.regex:
+            get_compiled(word_type)
+
+        load_times = glovar.load_times.copy()
+        text = "\n".join(f"{file}: {load_times[file]:.3f}s"
+                         for file in sorted(load_times, key=lambda f: load_times[f], reverse=True))
+        logger.warning(f"Load data report, {sum(load_times.values()):.3f}s in total:\n{text}")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Preload error: {e}", exc_info=True)
+
+    return result
+
+
 def renew() -> bool:
     # Renew the session
     result = False
@@ -0,0 +1,637 @@
+# SCP-079-TIP - Here's a tip
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-TIP.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import pickle
+import sqlite3
+from collections import OrderedDict
+from os import O_RDONLY, close, fsync, listdir, mkdir, open as open_fd, remove, replace
+from os.path import dirname, exists
+from threading import Lock, RLock
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+def append_journal(path: str, keys: tuple, fields: tuple) -> bool:
+    # Append a counter change record to the journal
+    result = False
+
+    try:
+        with open(path, "ab") as f:
+            pickle.dump((keys, fields), f)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Append journal error: {e}", exc_info=True)
+
+    return result
+
+
+def apply_journal(data: Any, keys: tuple, fields: tuple) -> bool:
+    # Apply a counter change record to the data
+    result = False
+
+    try:
+        for key in keys:
+            data = data.get(key)
+
+            if data is None:
+                return False
+
+        for field in fields:
+            if field not in data:
+                continue
+
+            data[field] += 1
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Apply journal error: {e}", exc_info=True)
+
+    return result
+
+
+def delete_journal(path: str) -> bool:
+    # Delete the journal after the data has been saved to a snapshot
+    result = False
+
+    try:
+        if not exists(path):
+            return False
+
+        result = remove(path) or True
+    except Exception as e:
+        logger.warning(f"Delete journal error: {e}", exc_info=True)
+
+    return result
+
+
+def get_journals(path: str, file: str) -> List[str]:
+    # Get the names of the journals belonging to a global variable
+    result = []
+
+    try:
+        if not exists(path):
+            return []
+
+        result = [name for name in listdir(path) if name == file or name.startswith(f"{file}.")]
+    except Exception as e:
+        logger.warning(f"Get journals error: {e}", exc_info=True)
+
+    return result
+
+
+def get_shards(path: str) -> Set[int]:
+    # Get the group ids of the saved shards
+    result = set()
+
+    try:
+        if not exists(path):
+            return set()
+
+        result = {int(name) for name in listdir(path) if name.lstrip("-").isdigit()}
+    except Exception as e:
+        logger.warning(f"Get shards error: {e}", exc_info=True)
+
+    return result
+
+
+def load_shards(path: str, backup_path: str) -> Dict[int, Any]:
+    # Load a global variable from it's per-group shards, fall back to the backup shard
+    result = {}
+
+    for p in [path, backup_path]:
+        not exists(p) and mkdir(p)
+
+    for gid in get_shards(path) | get_shards(backup_path):
+        result[gid] = load_snapshot(f"{path}/{gid}", f"{backup_path}/{gid}")
+
+    return result
+
+
+def load_snapshot(path: str, backup_path: str) -> Any:
+    # Load a snapshot, fall back to the previous generation
+    try:
+        if exists(path):
+            with open(path, "rb") as f:
+                return pickle.load(f)
+    except Exception as e:
+        logger.error(f"Load snapshot {path} error: {e}", exc_info=True)
+
+    with open(backup_path, "rb") as f:
+        return pickle.load(f)
+
+
+def read_journal(path: str) -> Iterator[Tuple[tuple, tuple]]:
+    # Read counter change records from the journal
+    if not exists(path):
+        return
+
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+            except Exception as e:
+                logger.warning(f"Read journal {path} error: {e}", exc_info=True)
+                break
+
+
+def replay_journal(path: str, data: Any) -> int:
+    # Replay the journal on the data loaded from the snapshot
+    result = 0
+
+    try:
+        for keys, fields in read_journal(path):
+            result += apply_journal(data, keys, fields)
+    except Exception as e:
+        logger.warning(f"Replay journal error: {e}", exc_info=True)
+
+    return result
+
+
+def sync_dir(path: str) -> bool:
+    # Flush the entries of a directory to the disk
+    fd = open_fd(path or ".", O_RDONLY)
+
+    try:
+        fsync(fd)
+    finally:
+        close(fd)
+
+    return True
+
+
+def write_snapshot(path: str, backup_path: str, data: Any) -> bool:
+    # Write a snapshot to a temp file, then rename it into place and keep the previous generation as the backup
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f)
+        f.flush()
+        fsync(f.fileno())
+
+    exists(path) and replace(path, backup_path)
+    replace(tmp_path, path)
+
+    # Make the renames durable, the previous generation has already left the snapshot's directory
+    for directory in {dirname(backup_path), dirname(path)}:
+        sync_dir(directory)
+
+    return True
+
+
+class Cache:
+    # A small LRU read cache in front of the storage backend
+
+    def __init__(self, size: int = 4096):
+        self.data = OrderedDict()
+        self.lock = Lock()
+        self.size = size
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self.lock:
+            if key not in self.data:
+                return default
+
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def pop(self, key: Any) -> None:
+        with self.lock:
+            self.data.pop(key, None)
+
+    def set(self, key: Any, value: Any) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+
+class SQLiteStorage:
+    # SQLite storage backend
+
+    def __init__(self, path: str, projects: Iterable[str]):
+        self.lock = RLock()
+        self.projects = tuple(projects)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        columns = ", ".join(f"{p} REAL NOT NULL DEFAULT 0.0" for p in self.projects)
+        self.execute(f"CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, {columns})")
+        self.execute("CREATE TABLE IF NOT EXISTS member_groups (key INTEGER PRIMARY KEY)")
+        self.execute("CREATE TABLE IF NOT EXISTS members (key INTEGER, id INTEGER, PRIMARY KEY (key, id)) "
+                     "WITHOUT ROWID")
+        self.execute("CREATE TABLE IF NOT EXISTS watches (key TEXT, id INTEGER, until INTEGER, PRIMARY KEY (key, id)) "
+                     "WITHOUT ROWID")
+        self.execute("CREATE INDEX IF NOT EXISTS watches_until ON watches (key, until)")
+        self.execute("CREATE TABLE IF NOT EXISTS bads (key TEXT, id INTEGER, PRIMARY KEY (key, id)) WITHOUT ROWID")
+        self.execute("CREATE TABLE IF NOT EXISTS imported (name TEXT PRIMARY KEY)")
+
+    def execute(self, sql: str, parameters: Iterable = ()) -> List[tuple]:
+        with self.lock:
+            return self.connection.execute(sql, tuple(parameters)).fetchall()
+
+    def execute_many(self, sql: str, parameters: Iterable[Iterable]) -> None:
+        with self.lock:
+            self.connection.execute("BEGIN")
+
+            try:
+                self.connection.executemany(sql, parameters)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def is_imported(self, name: str) -> bool:
+        return bool(self.execute("SELECT 1 FROM imported WHERE name = ?", (name,)))
+
+    def set_imported(self, name: str) -> None:
+        self.execute("INSERT OR IGNORE INTO imported (name) VALUES (?)", (name,))
+
+
+class ScoreView(dict):
+    # The score dict of a user, changes are written to the storage backend
+
+    def __init__(self, table: "UserTable", uid: int, scores: Dict[str, float]):
+        super().__init__(scores)
+        self.table = table
+        self.uid = uid
+
+    def __setitem__(self, project: str, score: float) -> None:
+        super().__setitem__(project, score)
+        self.table.set_score(self.uid, project, score)
+
+
+class UserTable:
+    # user_ids stored in the users table, {uid: {"score": {project: score}}}
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+        self.cache = Cache()
+        self.columns = ", ".join(storage.projects)
+
+    def __contains__(self, uid: int) -> bool:
+        return self.get_scores(uid) is not None
+
+    def __getitem__(self, uid: int) -> Dict[str, ScoreView]:
+        result = self.get(uid)
+
+        if result is None:
+            raise KeyError(uid)
+
+        return result
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self.storage.execute("SELECT id FROM users")])
+
+    def __len__(self) -> int:
+        return self.storage.execute("SELECT COUNT(*) FROM users")[0][0]
+
+    def __setitem__(self, uid: int, value: Dict[str, Dict[str, float]]) -> None:
+        scores = tuple(float(value.get("score", {}).get(p, 0.0)) for p in self.storage.projects)
+        self.storage.execute(f"INSERT OR REPLACE INTO users (id, {self.columns}) "
+                             f"VALUES (?, {', '.join('?' for _ in scores)})", (uid,) + scores)
+        self.cache.set(uid, scores)
+
+    def clear(self) -> None:
+        self.storage.execute("DELETE FROM users")
+        self.cache.clear()
+
+    def copy(self) -> Dict[int, Dict[str, Dict[str, float]]]:
+        rows = self.storage.execute(f"SELECT id, {self.columns} FROM users")
+        return {row[0]: {"score": dict(zip(self.storage.projects, row[1:]))} for row in rows}
+
+    def get(self, uid: int, default: Any = None) -> Any:
+        scores = self.get_scores(uid)
+
+        if scores is None:
+            return default
+
+        return {"score": ScoreView(self, uid, dict(zip(self.storage.projects, scores)))}
+
+    def get_scores(self, uid: int) -> Optional[tuple]:
+        scores = self.cache.get(uid, False)
+
+        if scores is not False:
+            return scores
+
+        rows = self.storage.execute(f"SELECT {self.columns} FROM users WHERE id = ?", (uid,))
+        scores = rows[0] if rows else None
+        self.cache.set(uid, scores)
+
+        return scores
+
+    def pop(self, uid: int, default: Any = None) -> Any:
+        result = self.get(uid, default)
+        self.storage.execute("DELETE FROM users WHERE id = ?", (uid,))
+        self.cache.set(uid, None)
+
+        return result
+
+    def set_score(self, uid: int, project: str, score: float) -> None:
+        if project not in self.storage.projects:
+            return
+
+        self.storage.execute(f"INSERT INTO users (id, {project}) VALUES (?, ?) "
+                             f"ON CONFLICT (id) DO UPDATE SET {project} = excluded.{project}", (uid, score))
+        self.cache.pop(uid)
+
+    def total(self, uid: int) -> float:
+        return sum(self.get_scores(uid) or ())
+
+    def update(self, data: Dict[int, Dict[str, Dict[str, float]]]) -> None:
+        self.storage.execute_many(
+            f"INSERT OR REPLACE INTO users (id, {self.columns}) "
+            f"VALUES (?, {', '.join('?' for _ in self.storage.projects)})",
+            [(uid,) + tuple(float(data[uid].get("score", {}).get(p, 0.0)) for p in self.storage.projects)
+             for uid in data]
+        )
+        self.cache.clear()
+
+
+class SetView:
+    # A set of ids with the same key in a (key, id) table
+
+    def __init__(self, storage: SQLiteStorage, table: str, key: Union[int, str], cache: Cache):
+        self.storage = storage
+        self.table = table
+        self.key = key
+        self.cache = cache
+
+    def __contains__(self, the_id: int) -> bool:
+        result = self.cache.get((self.key, the_id))
+
+        if result is not None:
+            return result
+
+        result = bool(self.storage.execute(f"SELECT 1 FROM {self.table} WHERE key = ? AND id = ?",
+                                           (self.key, the_id)))
+        self.cache.set((self.key, the_id), result)
+
+        return result
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self.storage.execute(f"SELECT id FROM {self.table} WHERE key = ?",
+                                                            (self.key,))])
+
+    def __len__(self) -> int:
+        return self.storage.execute(f"SELECT COUNT(*) FROM {self.table} WHERE key = ?", (self.key,))[0][0]
+
+    def add(self, the_id: int) -> None:
+        self.storage.execute(f"INSERT OR IGNORE INTO {self.table} (key, id) VALUES (?, ?)", (self.key, the_id))
+        self.cache.set((self.key, the_id), True)
+
+    def clear(self) -> None:
+        self.storage.execute(f"DELETE FROM {self.table} WHERE key = ?", (self.key,))
+        self.cache.clear()
+
+    def copy(self) -> Set[int]:
+        return set(self)
+
+    def discard(self, the_id: int) -> None:
+        self.storage.execute(f"DELETE FROM {self.table} WHERE key = ? AND id = ?", (self.key, the_id))
+        self.cache.set((self.key, the_id), False)
+
+    def update(self, ids: Iterable[int]) -> None:
+        self.storage.execute_many(f"INSERT OR IGNORE INTO {self.table} (key, id) VALUES (?, ?)",
+                                  [(self.key, the_id) for the_id in ids])
+        self.cache.clear()
+
+
+class MemberTable:
+    # member_ids stored in the members table, {gid: {uid}}
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+        self.cache = Cache()
+
+    def __contains__(self, gid: int) -> bool:
+        return bool(self.storage.execute("SELECT 1 FROM member_groups WHERE key = ?", (gid,)))
+
+    def __getitem__(self, gid: int) -> SetView:
+        result = self.get(gid)
+
+        if result is None:
+            raise KeyError(gid)
+
+        return result
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self.storage.execute("SELECT key FROM member_groups")])
+
+    def __len__(self) -> int:
+        return self.storage.execute("SELECT COUNT(*) FROM member_groups")[0][0]
+
+    def __setitem__(self, gid: int, uids: Iterable[int]) -> None:
+        self.storage.execute("INSERT OR IGNORE INTO member_groups (key) VALUES (?)", (gid,))
+        self.storage.execute("DELETE FROM members WHERE key = ?", (gid,))
+        self.cache.clear()
+        SetView(self.storage, "members", gid, self.cache).update(uids)
+
+    def clear(self) -> None:
+        self.storage.execute("DELETE FROM member_groups")
+        self.storage.execute("DELETE FROM members")
+        self.cache.clear()
+
+    def copy(self) -> Dict[int, Set[int]]:
+        return {gid: self[gid].copy() for gid in self}
+
+    def get(self, gid: int, default: Any = None) -> Any:
+        if gid not in self:
+            return default
+
+        return SetView(self.storage, "members", gid, self.cache)
+
+    def pop(self, gid: int, default: Any = None) -> Any:
+        if gid not in self:
+            return default
+
+        result = self[gid].copy()
+        self.storage.execute("DELETE FROM member_groups WHERE key = ?", (gid,))
+        self.storage.execute("DELETE FROM members WHERE key = ?", (gid,))
+        self.cache.clear()
+
+        return result
+
+    def update(self, data: Dict[int, Iterable[int]]) -> None:
+        for gid in data:
+            self[gid] = data[gid]
+
+
+class BadTable:
+    # bad_ids stored in the bads table, {"channels": {cid}, "users": {uid}}
+
+    def __init__(self, storage: SQLiteStorage, keys: Iterable[str]):
+        self.storage = storage
+        self.cache = Cache()
+        self.keys = tuple(keys)
+
+    def __getitem__(self, key: str) -> SetView:
+        if key not in self.keys:
+            raise KeyError(key)
+
+        return SetView(self.storage, "bads", key, self.cache)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys)
+
+    def clear(self) -> None:
+        self.storage.execute("DELETE FROM bads")
+        self.cache.clear()
+
+    def copy(self) -> Dict[str, Set[int]]:
+        return {key: self[key].copy() for key in self.keys}
+
+    def update(self, data: Dict[str, Iterable[int]]) -> None:
+        for key in data:
+            key in self.keys and self[key].update(data[key])
+
+
+class WatchView:
+    # The watch dict of a type, {uid: until}
+
+    def __init__(self, storage: SQLiteStorage, key: str, cache: Cache):
+        self.storage = storage
+        self.key = key
+        self.cache = cache
+
+    def __contains__(self, uid: int) -> bool:
+        return self.get(uid) is not None
+
+    def __getitem__(self, uid: int) -> int:
+        result = self.get(uid)
+
+        if result is None:
+            raise KeyError(uid)
+
+        return result
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([row[0] for row in self.storage.execute("SELECT id FROM watches WHERE key = ?", (self.key,))])
+
+    def __len__(self) -> int:
+        return self.storage.execute("SELECT COUNT(*) FROM watches WHERE key = ?", (self.key,))[0][0]
+
+    def __setitem__(self, uid: int, until: int) -> None:
+        self.storage.execute("INSERT OR REPLACE INTO watches (key, id, until) VALUES (?, ?, ?)",
+                             (self.key, uid, until))
+        self.cache.set((self.key, uid), until)
+
+    def clear(self) -> None:
+        self.storage.execute("DELETE FROM watches WHERE key = ?", (self.key,))
+        self.cache.clear()
+
+    def copy(self) -> Dict[int, int]:
+        return dict(self.items())
+
+    def get(self, uid: int, default: Any = None) -> Any:
+        result = self.cache.get((self.key, uid), False)
+
+        if result is False:
+            rows = self.storage.execute("SELECT until FROM watches WHERE key = ? AND id = ?", (self.key, uid))
+            result = rows[0][0] if rows else None
+            self.cache.set((self.key, uid), result)
+
+        if result is None:
+            return default
+
+        return result
+
+    def items(self) -> List[Tuple[int, int]]:
+        return self.storage.execute("SELECT id, until FROM watches WHERE key = ?", (self.key,))
+
+    def pop(self, uid: int, default: Any = None) -> Any:
+        result = self.get(uid, default)
+        self.storage.execute("DELETE FROM watches WHERE key = ? AND id = ?", (self.key, uid))
+        self.cache.set((self.key, uid), None)
+
+        return result
+
+    def prune(self, now: int) -> int:
+        with self.storage.lock:
+            result = self.storage.execute("SELECT COUNT(*) FROM watches WHERE key = ? AND until <= ?",
+                                          (self.key, now))[0][0]
+            result and self.storage.execute("DELETE FROM watches WHERE key = ? AND until <= ?", (self.key, now))
+
+        result and self.cache.clear()
+
+        return result
+
+    def update(self, data: Dict[int, int]) -> None:
+        self.storage.execute_many("INSERT OR REPLACE INTO watches (key, id, until) VALUES (?, ?, ?)",
+                                  [(self.key, uid, data[uid]) for uid in data])
+        self.cache.clear()
+
+
+class WatchTable:
+    # watch_ids stored in the watches table, {"ban": {uid: until}, "delete": {uid: until}}
+
+    def __init__(self, storage: SQLiteStorage, keys: Iterable[str]):
+        self.storage = storage
+        self.cache = Cache()
+        self.keys = tuple(keys)
+
+    def __getitem__(self, key: str) -> WatchView:
+        if key not in self.keys:
+            raise KeyError(key)
+
+        return WatchView(self.storage, key, self.cache)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys)
+
+    def clear(self) -> None:
+        self.storage.execute("DELETE FROM watches")
+        self.cache.clear()
+
+    def copy(self) -> Dict[str, Dict[int, int]]:
+        return {key: self[key].copy() for key in self.keys}
+
+    def update(self, data: Dict[str, Dict[int, int]]) -> None:
+        for key in data:
+            key in self.keys and self[key].update(data[key])
+
+
+def get_table(storage: SQLiteStorage, name: str, default: Any) -> Any:
+    # Get the table object of a global variable stored in the SQLite backend
+    result = None
+
+    try:
+        if name == "user_ids":
+            result = UserTable(storage)
+        elif name == "member_ids":
+            result = MemberTable(storage)
+        elif name == "watch_ids":
+            result = WatchTable(storage, default)
+        elif name == "bad_ids":
+            result = BadTable(storage, default)
+    except Exception as e:
+        logger.warning(f"Get table {name} error: {e}", exc_info=True)
+
+    return result
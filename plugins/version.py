@@ -23,6 +23,8 @@ from random import choice
 from shutil import move, rmtree
 from string import ascii_letters, digits
 
+from .storage import load_snapshot, replay_journal
+
 
 def delete_file(path: str) -> bool:
     # Delete a file
@@ -161,8 +163,8 @@ def version_0() -> bool:
     try:
         exists("data/tmp") and rmtree("data/tmp")
 
-        for path in ["data", "data/config", "data/pickle", "data/pickle/backup",
-                     "data/log", "data/session", "data/tmp"]:
+        for path in ["data", "data/config", "data/pickle", "data/pickle/backup", "data/pickle/backup/shard",
+                     "data/pickle/journal", "data/pickle/shard", "data/log", "data/session", "data/sqlite", "data/tmp"]:
             not exists(path) and mkdir(path)
 
         result = True
@@ -427,6 +429,55 @@ def version_0_2_8() -> bool:
     return result
 
 
+def version_0_2_9() -> bool:
+    # Version 0.2.9
+    result = False
+
+    try:
+        if exists("data/pickle/current"):
+            with open("data/pickle/current", "rb") as f:
+                current = pickle.load(f)
+
+            if current >= "0.2.9":
+                return False
+
+        file_list = [f for f in ["channels", "configs", "keywords", "member_ids", "message_ids", "ots", "rms",
+                                 "welcomes"]
+                     if isfile(f"data/pickle/{f}") or isfile(f"data/pickle/backup/{f}")]
+
+        if not file_list:
+            return False
+
+        # Write the shards of all the files before deleting any old file
+        for file in file_list:
+            data = load_snapshot(f"data/pickle/{file}", f"data/pickle/backup/{file}")
+            replay_journal(f"data/pickle/journal/{file}", data)
+
+            # Split the data into one file per group
+            for path in [f"data/pickle/shard/{file}", f"data/pickle/backup/shard/{file}"]:
+                not exists(path) and mkdir(path)
+
+            for gid in list(data):
+                for path in [f"data/pickle/shard/{file}", f"data/pickle/backup/shard/{file}"]:
+                    with open(f"{path}/{gid}", "wb") as f:
+                        pickle.dump(data[gid], f)
+
+        # The counter journals have been folded into the shards
+        for file in file_list:
+            delete_file(f"data/pickle/journal/{file}")
+            delete_file(f"data/pickle/backup/{file}")
+            delete_file(f"data/pickle/{file}")
+
+        print("Version 0.2.9 updated!\n")
+
+        result = True
+    except Exception as e:
+        print(f"Version 0.2.9 error: {e}")
+        raise SystemExit("[DATA CORRUPTION]")
+
+    return result
+
+
 def version_control() -> bool:
     # Version control
     result = False
@@ -440,6 +491,8 @@ def version_control() -> bool:
 
         version_0_2_8()
 
+        version_0_2_9()
+
         result = True
     except Exception as e:
         print(f"Version control error: {e}")